@@ -0,0 +1,202 @@
+# Shared Embedder Registry
+# One lazily loaded embedding model per name, shared by every skill in the process
+
+import hashlib
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from embedding_cache import CachedEmbedder, EmbeddingCache
+
+
+# Model name that resolves to HashingEmbedder instead of a real model
+STUB_MODEL = "stub"
+
+# Set to a model name (e.g. "stub") to override every get_embedder() call,
+# e.g. SKILLS_EMBEDDER=stub for tests and tooling that never need real vectors
+EMBEDDER_ENV = "SKILLS_EMBEDDER"
+
+# Set to an SQLite path to put a persistent EmbeddingCache in front of every
+# shared embedder (see set_embedding_cache)
+EMBEDDING_CACHE_ENV = "SKILLS_EMBEDDING_CACHE"
+
+
+class HashingEmbedder:
+    """
+    Model-free stand-in for SentenceTransformer
+
+    Hashes lowercase tokens into a fixed number of signed buckets and
+    L2-normalizes, so identical texts get identical vectors and texts
+    sharing words are similar. Loads instantly; use for tests, tooling
+    and dry runs, not for retrieval quality.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        normalize_embeddings: bool = True,
+        **kwargs
+    ) -> np.ndarray:
+        """
+        Args:
+            sentences: A string or list of strings
+            batch_size: Ignored (accepted for SentenceTransformer compatibility)
+            normalize_embeddings: Ignored, vectors are always unit length
+
+        Returns:
+            (dim,) array for a string, (n, dim) array for a list
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                embeddings[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.maximum(norms, 1e-12)
+        return embeddings[0] if single else embeddings
+
+
+class LazyEmbedder:
+    """
+    Embedder proxy that builds its model on first use
+
+    Constructing one is free; the model is loaded (once, thread-safe) on
+    the first encode() or attribute access that needs it.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self._factory = factory
+        self._model: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self) -> Any:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def encode(self, sentences: Union[str, List[str]], **kwargs) -> np.ndarray:
+        return self.model.encode(sentences, **kwargs)
+
+    def __getattr__(self, attr: str) -> Any:
+        # Only reached for attributes not defined on the proxy itself
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.model, attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"LazyEmbedder({self.name!r}, {state})"
+
+
+def _sentence_transformer_factory(name: str) -> Callable[[], Any]:
+    def load():
+        # Imported here so processes that never embed skip the torch import too
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(name)
+    return load
+
+
+_factories: Dict[str, Callable[[], Any]] = {
+    STUB_MODEL: HashingEmbedder
+}
+_models: Dict[str, LazyEmbedder] = {}
+_embedders: Dict[str, Any] = {}
+_cache: Optional[EmbeddingCache] = None
+_cache_configured = False
+_registry_lock = threading.Lock()
+
+
+def register_embedder(name: str, factory: Callable[[], Any]):
+    """
+    Register how to build the embedder for a model name
+
+    Replaces any existing shared instance of that name, so call this
+    before the first get_embedder(name).
+
+    Args:
+        name: Model name passed to get_embedder
+        factory: Zero-argument callable returning an object with
+            SentenceTransformer's encode()
+    """
+    with _registry_lock:
+        _factories[name] = factory
+        _models.pop(name, None)
+        _embedders.pop(name, None)
+
+
+def set_embedding_cache(cache: Optional[EmbeddingCache]):
+    """
+    Put a persistent EmbeddingCache in front of every shared embedder
+
+    Applies to instances returned by later get_embedder() calls; pass
+    None to turn caching off. Without a call, EMBEDDING_CACHE_ENV (an
+    SQLite path) enables a cache on first get_embedder().
+    """
+    global _cache, _cache_configured
+    with _registry_lock:
+        _cache = cache
+        _cache_configured = True
+        _embedders.clear()
+
+
+def get_embedder(name: str) -> Any:
+    """
+    Shared lazy embedder for a model name
+
+    Every caller in the process gets the same instance, and the model is
+    only loaded on first encode (with an embedding cache, only on the
+    first cache miss). Unregistered names load a SentenceTransformer; the
+    EMBEDDER_ENV environment variable, when set, overrides the requested
+    name.
+    """
+    global _cache, _cache_configured
+    name = os.environ.get(EMBEDDER_ENV) or name
+    with _registry_lock:
+        embedder = _embedders.get(name)
+        if embedder is not None:
+            return embedder
+
+        if not _cache_configured:
+            cache_path = os.environ.get(EMBEDDING_CACHE_ENV)
+            _cache = EmbeddingCache(cache_path) if cache_path else None
+            _cache_configured = True
+
+        model = _models.get(name)
+        if model is None:
+            factory = _factories.get(name) or _sentence_transformer_factory(name)
+            model = LazyEmbedder(name, factory)
+            _models[name] = model
+
+        embedder = CachedEmbedder(model, name, _cache) if _cache is not None else model
+        _embedders[name] = embedder
+        return embedder
+
+
+def clear_embedders():
+    """Drop all shared instances (registered factories are kept)"""
+    with _registry_lock:
+        _models.clear()
+        _embedders.clear()
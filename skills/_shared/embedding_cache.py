@@ -0,0 +1,315 @@
+# Persistent Embedding Cache
+# Content-addressed (model, text hash) -> vector store shared by every skill
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "skills" / "embeddings.sqlite"
+
+# Keys per SELECT ... IN (...) (stays under SQLite's bound-variable limit)
+_SQL_BATCH = 500
+
+# encode() kwargs that never change the vectors; every other kwarg is part of
+# the cache namespace (see CachedEmbedder._namespace)
+_NEUTRAL_ENCODE_KWARGS = {
+    'batch_size', 'show_progress_bar', 'device', 'normalize_embeddings',
+    'convert_to_numpy', 'convert_to_tensor', 'output_value', 'precision'
+}
+
+
+def text_key(text: str) -> bytes:
+    """Content address of a text: SHA-256 of its UTF-8 bytes"""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache with an in-memory LRU front
+
+    Vectors are stored in SQLite (WAL mode, so several processes can share
+    one file), keyed by (model, SHA-256 of the text). The most recently
+    used vectors are also kept in memory. When the database grows past
+    max_bytes, the least recently used rows are evicted down to 90%.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_CACHE_PATH,
+        max_bytes: int = 2 * 1024 ** 3,
+        memory_items: int = 10000
+    ):
+        """
+        Args:
+            path: SQLite file (created if missing); ":memory:" for a
+                process-local cache
+            max_bytes: Size cap for stored vectors
+            memory_items: Vectors kept in the in-memory LRU front
+        """
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                key BLOB NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, key)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._stored_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up cached vectors
+
+        Returns:
+            One float32 vector per text, None where not cached
+        """
+        keys = [text_key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        missing: Dict[bytes, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get((model, key))
+                if vector is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._memory.move_to_end((model, key))
+                    results[i] = vector
+
+            found = []
+            pending = list(missing)
+            for start in range(0, len(pending), _SQL_BATCH):
+                batch = pending[start:start + _SQL_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? "
+                    f"AND key IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                ).fetchall()
+                for key, blob in rows:
+                    key = bytes(key)
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    for i in missing[key]:
+                        results[i] = vector
+                    self._remember((model, key), vector)
+                    found.append(key)
+
+            if found:
+                # Touch rows so eviction keeps what is still in use
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                    [(now, model, key) for key in found]
+                )
+                self._conn.commit()
+
+            hits = sum(result is not None for result in results)
+            self._hits += hits
+            self._misses += len(results) - hits
+
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: np.ndarray):
+        """Store one vector per text (overwrites existing entries)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings[None, :]
+
+        now = time.time()
+        rows = {}
+        for text, vector in zip(texts, embeddings):
+            key = text_key(text)
+            rows[key] = (model, key, len(vector), vector.tobytes(), now)
+
+        with self._lock:
+            for _, key, _, blob, _ in rows.values():
+                self._remember((model, key), np.frombuffer(blob, dtype=np.float32))
+
+            previous = self._stored_size(model, list(rows))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, dim, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                list(rows.values())
+            )
+            self._stored_bytes += sum(len(row[3]) for row in rows.values()) - previous
+            if self._stored_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._stored_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0],
+                'stored_bytes': self._stored_bytes,
+                'memory_items': len(self._memory),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _remember(self, key: tuple, vector: np.ndarray):
+        """Insert into the in-memory LRU front"""
+        if self.memory_items <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _stored_size(self, model: str, keys: List[bytes]) -> int:
+        """Bytes already stored under keys (replaced by an upsert)"""
+        total = 0
+        for start in range(0, len(keys), _SQL_BATCH):
+            batch = keys[start:start + _SQL_BATCH]
+            total += self._conn.execute(
+                f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE model = ? "
+                f"AND key IN ({','.join('?' * len(batch))})",
+                [model, *batch]
+            ).fetchone()[0]
+        return total
+
+    def _evict(self):
+        """Delete least recently used rows until 90% of max_bytes"""
+        target = int(self.max_bytes * 0.9)
+        while self._stored_bytes > target:
+            rows = self._conn.execute(
+                "SELECT model, key, LENGTH(vector) FROM embeddings "
+                "ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._stored_bytes = 0
+                break
+
+            evicted = []
+            for model, key, size in rows:
+                evicted.append((model, key))
+                self._memory.pop((model, bytes(key)), None)
+                self._stored_bytes -= size
+                if self._stored_bytes <= target:
+                    break
+            self._conn.executemany(
+                "DELETE FROM embeddings WHERE model = ? AND key = ?",
+                evicted
+            )
+
+
+class CachedEmbedder:
+    """
+    Wraps an embedder so encode() only runs the model on cache misses
+
+    Misses from one encode() call are deduplicated and encoded in a
+    single batch, then written back. A fully cached call never touches
+    the model, so a LazyEmbedder underneath is never loaded.
+    """
+
+    def __init__(self, embedder: Any, model_name: str, cache: EmbeddingCache):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.cache = cache
+
+    def encode(self, sentences: Union[str, List[str]], **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return self.embedder.encode(texts, **kwargs)
+
+        namespace = self._namespace(kwargs)
+        if namespace is None:
+            return self.embedder.encode(sentences, **kwargs)
+
+        vectors = self.cache.get_many(namespace, texts)
+        misses = list(dict.fromkeys(
+            text for text, vector in zip(texts, vectors) if vector is None
+        ))
+        if misses:
+            encoded = np.asarray(self.embedder.encode(misses, **kwargs), dtype=np.float32)
+            self.cache.put_many(namespace, misses, encoded)
+            by_text = dict(zip(misses, encoded))
+            vectors = [
+                vector if vector is not None else by_text[text]
+                for text, vector in zip(texts, vectors)
+            ]
+
+        embeddings = np.stack(vectors)
+        return embeddings[0] if single else embeddings
+
+    def _namespace(self, kwargs: Dict[str, Any]) -> Optional[str]:
+        """
+        Cache namespace for an encode() call
+
+        Vectors encoded with different options (normalize_embeddings,
+        prompt, prompt_name, ...) are different entries. Returns None
+        (bypass the cache) for calls whose output is not a float vector
+        per text, e.g. tensors or quantized embeddings.
+        """
+        if kwargs.get('convert_to_tensor') or kwargs.get('convert_to_numpy') is False:
+            return None
+        if kwargs.get('output_value') not in (None, 'sentence_embedding'):
+            return None
+        if kwargs.get('precision') not in (None, 'float32'):
+            return None
+
+        # Normalized and raw vectors of the same text are different entries
+        options = {
+            key: value for key, value in kwargs.items()
+            if key not in _NEUTRAL_ENCODE_KWARGS
+        }
+        namespace = self.model_name
+        if kwargs.get('normalize_embeddings'):
+            namespace += ":normalized"
+        if options:
+            try:
+                encoded = json.dumps(options, sort_keys=True)
+            except TypeError:
+                # Options without a stable serialization can't be keyed
+                return None
+            namespace += ":" + hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+        return namespace
+
+    def __getattr__(self, attr: str) -> Any:
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.embedder, attr)
@@ -0,0 +1,292 @@
+# Parallel, Resumable RAGAS Evaluation Runner
+# Streams a JSONL dataset through a process pool and appends results as they finish
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
+
+from ragas_evaluator import EvaluationResult, RAGASEvaluator
+
+
+def case_id(test_case: Dict[str, Any]) -> str:
+    """The case's 'id', or a content hash for datasets without ids"""
+    if isinstance(test_case, dict) and test_case.get('id') is not None:
+        return str(test_case['id'])
+    content = json.dumps(test_case, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def read_jsonl(path: str, allow_partial_last: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records from a JSONL file (blank lines are skipped)
+
+    Args:
+        allow_partial_last: Ignore an unparsable last line, i.e. a write
+            cut off by a crash (for output files); otherwise any bad line
+            raises ValueError
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                if allow_partial_last and not line.endswith("\n"):
+                    return
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({e})") from e
+
+
+def scored_case_ids(output_path: str) -> Set[str]:
+    """
+    Ids scored successfully in an output JSONL (empty if it doesn't exist)
+
+    A case counts as done when its latest record has no error, so failed
+    cases are retried on resume. Only id -> error flag is kept in memory.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    succeeded: Dict[str, bool] = {}
+    for record in read_jsonl(output_path, allow_partial_last=True):
+        succeeded[record['id']] = record.get('error') is None
+    return {identifier for identifier, ok in succeeded.items() if ok}
+
+
+def _drop_partial_line(path: str):
+    """Truncate a trailing line without newline so appends start on a fresh line"""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if not size:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        # Walk back to the last complete line
+        position = size
+        while position > 0:
+            step = min(65536, position)
+            f.seek(position - step)
+            block = f.read(step)
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                f.truncate(position - step + newline + 1)
+                return
+            position -= step
+        f.truncate(0)
+
+
+def iter_results(output_path: str) -> Iterator[EvaluationResult]:
+    """
+    Stream an output JSONL back as EvaluationResults (e.g. into generate_report)
+
+    Only the last record per id is yielded, so a retried case is counted
+    once, with its latest result. The file is read twice: first to find
+    each id's last record (only id -> position is kept), then to stream
+    those records.
+    """
+    last: Dict[str, int] = {}
+    for position, record in enumerate(read_jsonl(output_path, allow_partial_last=True)):
+        last[record['id']] = position
+
+    for position, record in enumerate(read_jsonl(output_path, allow_partial_last=True)):
+        if last.get(record['id']) == position:
+            yield EvaluationResult(**{key: value for key, value in record.items() if key != 'id'})
+
+
+# Per-process evaluator, created by the pool initializer
+_worker_evaluator: Optional[RAGASEvaluator] = None
+
+
+def _init_worker(evaluator_kwargs: Dict[str, Any]):
+    global _worker_evaluator
+    _worker_evaluator = RAGASEvaluator(**evaluator_kwargs)
+
+
+def _evaluate_shard(shard: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Process-pool task: score a shard of (case id, test case) with batch_evaluate
+
+    Never raises: if scoring fails, every case of the shard gets an error
+    record, so the run goes on and a resume retries them.
+    """
+    try:
+        results = _worker_evaluator.batch_evaluate([test_case for _, test_case in shard])
+    except Exception as e:
+        return [_error_record(shard_case_id, test_case, e) for shard_case_id, test_case in shard]
+    return [
+        {'id': shard_case_id, **asdict(result)}
+        for (shard_case_id, _), result in zip(shard, results)
+    ]
+
+
+def _error_record(identifier: str, test_case: Any, error: Exception) -> Dict[str, Any]:
+    """Output record for a case that could not be scored"""
+    test_case = test_case if isinstance(test_case, dict) else {}
+    result = EvaluationResult(
+        query=test_case.get('query'),
+        response=test_case.get('response'),
+        retrieved_contexts=test_case.get('retrieved_contexts'),
+        ground_truth=test_case.get('ground_truth'),
+        context_precision=0.0,
+        context_recall=0.0,
+        faithfulness=0.0,
+        answer_relevancy=0.0,
+        response_time=0.0,
+        cost=0.0,
+        error=f"{type(error).__name__}: {error}"
+    )
+    return {'id': identifier, **asdict(result)}
+
+
+def _shards(cases: Iterable[Tuple[str, Dict[str, Any]]], size: int) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+    iterator = iter(cases)
+    while True:
+        shard = list(itertools.islice(iterator, size))
+        if not shard:
+            return
+        yield shard
+
+
+def run_evaluation(
+    dataset_path: str,
+    output_path: str,
+    workers: Optional[int] = None,
+    shard_size: int = 64,
+    max_pending: Optional[int] = None,
+    resume: bool = True,
+    evaluator_kwargs: Optional[Dict[str, Any]] = None,
+    mp_context: Optional[Any] = None
+) -> Dict[str, int]:
+    """
+    Score a JSONL dataset into an append-only JSONL of results
+
+    Test cases are streamed from dataset_path and split into shards of
+    shard_size, which worker processes score with batch_evaluate. Each
+    worker builds its own RAGASEvaluator (and embedder) once in the pool
+    initializer. At most max_pending shards are in flight, so the dataset
+    is never fully in memory. Finished shards are appended to output_path
+    and flushed immediately, so a crash loses at most the in-flight
+    shards. With resume=True, cases already scored without error in
+    output_path are skipped; errored cases are scored again and their
+    new record supersedes the old one (see iter_results).
+
+    Args:
+        dataset_path: JSONL with one test case per line (see
+            RAGASEvaluator.batch_evaluate), optionally with an 'id'
+        output_path: JSONL of {'id', **EvaluationResult fields}
+        workers: Worker processes (default: CPU count; 0 scores in this
+            process)
+        shard_size: Test cases per task
+        max_pending: Maximum shards in flight (default: 2 * workers)
+        resume: Skip cases already scored in output_path (False:
+            overwrite it)
+        evaluator_kwargs: RAGASEvaluator arguments (embedding_model,
+            thresholds, ...)
+        mp_context: Optional multiprocessing context for the pool
+
+    Returns:
+        Dict with 'scored' (this run) and 'skipped' (already scored) counts
+    """
+    evaluator_kwargs = evaluator_kwargs or {}
+    done = set()
+    if resume:
+        _drop_partial_line(output_path)
+        done = scored_case_ids(output_path)
+    counts = {'scored': 0, 'skipped': 0}
+
+    def pending_cases() -> Iterator[Tuple[str, Dict[str, Any]]]:
+        seen = set()
+        for test_case in read_jsonl(dataset_path):
+            identifier = case_id(test_case)
+            if identifier in done or identifier in seen:
+                counts['skipped'] += 1
+                continue
+            seen.add(identifier)
+            yield identifier, test_case
+
+    shards = _shards(pending_cases(), shard_size)
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as output:
+        def write(records: List[Dict[str, Any]]):
+            for record in records:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            counts['scored'] += len(records)
+
+        if workers == 0:
+            _init_worker(evaluator_kwargs)
+            for shard in shards:
+                write(_evaluate_shard(shard))
+            return counts
+
+        workers = workers or os.cpu_count()
+        max_pending = max_pending or 2 * workers
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(evaluator_kwargs,)
+        ) as pool:
+            in_flight = set()
+            exhausted = False
+
+            while True:
+                while not exhausted and len(in_flight) < max_pending:
+                    shard = next(shards, None)
+                    if shard is None:
+                        exhausted = True
+                    else:
+                        in_flight.add(pool.submit(_evaluate_shard, shard))
+
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    write(future.result())
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel, resumable RAGAS evaluation over a JSONL dataset")
+    parser.add_argument("dataset", help="JSONL test cases")
+    parser.add_argument("output", help="JSONL results (appended to when resuming)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (0: in-process)")
+    parser.add_argument("--shard-size", type=int, default=64)
+    parser.add_argument("--max-pending", type=int, default=None)
+    parser.add_argument("--no-resume", action="store_true", help="overwrite output instead of resuming")
+    parser.add_argument("--embedding-model", default="BAAI/bge-large-en-v1.5")
+    parser.add_argument("--report", default=None, help="write generate_report() JSON for all results here")
+    args = parser.parse_args()
+
+    counts = run_evaluation(
+        args.dataset,
+        args.output,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        max_pending=args.max_pending,
+        resume=not args.no_resume,
+        evaluator_kwargs={'embedding_model': args.embedding_model}
+    )
+    print(json.dumps(counts))
+
+    if args.report:
+        report = RAGASEvaluator(embedding_model=args.embedding_model).generate_report(
+            iter_results(args.output)
+        )
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=float)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
 # RAGAS Metrics Implementation
 # Complete evaluation framework for RAG systems
 
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import math
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from dataclasses import dataclass, field
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import json
 
+# Process-wide embedder registry shared with the other skills (skills/_shared)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "_shared"))
+from embedder_registry import get_embedder
+
 
 @dataclass
 class EvaluationResult:
@@ -30,6 +37,226 @@ class EvaluationResult:
     error: Optional[str] = None
 
 
+# Keys every batch_evaluate test case must have
+REQUIRED_CASE_KEYS = ('query', 'response', 'retrieved_contexts', 'ground_truth')
+
+# generate_report metric names and overall_score weights
+METRIC_WEIGHTS = {
+    'context_precision': 0.2,
+    'context_recall': 0.2,
+    'faithfulness': 0.3,
+    'answer_relevancy': 0.3
+}
+
+
+@dataclass
+class RunningStats:
+    """Streaming count / sum / mean / population std / min / max (Welford), mergeable"""
+    count: int = 0
+    total: float = 0.0
+    mean: float = 0.0
+    m2: float = 0.0
+    min: float = math.inf
+    max: float = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "RunningStats"):
+        """Combine with stats over a disjoint set of values (Chan et al.)"""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+
+@dataclass
+class DDSketch:
+    """
+    Mergeable quantile sketch with relative error guarantees
+
+    Positive values fall into logarithmic buckets of ratio gamma, so any
+    quantile is returned within relative_accuracy of the exact value
+    (1% by default) using O(log(max/min)) memory, and sketches from
+    separate workers merge by adding bucket counts.
+    """
+    relative_accuracy: float = 0.01
+    buckets: Counter = field(default_factory=Counter)
+    zero_count: int = 0
+    count: int = 0
+    min: float = math.inf
+    max: float = -math.inf
+
+    @property
+    def gamma(self) -> float:
+        return (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+
+    def add(self, value: float):
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 0:
+            # Latencies and costs: non-positive values share one bucket
+            self.zero_count += 1
+        else:
+            self.buckets[math.ceil(math.log(value, self.gamma))] += 1
+
+    def merge(self, other: "DDSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge DDSketches with different relative_accuracy")
+        self.buckets.update(other.buckets)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """
+        Value at quantile q in [0, 1] (q * 100 percentile)
+
+        Interpolates linearly between the two adjacent ranks, like
+        np.percentile's default, so for non-negative values the result is
+        within relative_accuracy of np.percentile even for a handful of
+        samples.
+        """
+        if not self.count:
+            return math.nan
+
+        rank = q * (self.count - 1)
+        lower = math.floor(rank)
+        upper = min(lower + 1, self.count - 1)
+        lower_value = self._value_at_rank(lower)
+        if upper == lower:
+            return lower_value
+        upper_value = self._value_at_rank(upper)
+        return lower_value + (rank - lower) * (upper_value - lower_value)
+
+    def _value_at_rank(self, rank: int) -> float:
+        """Estimate of the rank-th smallest value (0-based)"""
+        # The extremes are tracked exactly
+        if rank == 0:
+            return self.min
+        if rank == self.count - 1:
+            return self.max
+        if rank < self.zero_count:
+            return min(max(0.0, self.min), self.max)
+
+        seen = self.zero_count
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # Bucket (gamma^(key-1), gamma^key]: midpoint in relative terms
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+class ReportAggregator:
+    """
+    Streaming, mergeable aggregate behind RAGASEvaluator.generate_report
+
+    Consumes EvaluationResults one at a time in O(1) memory per metric
+    (plus the error list), so reports over huge runs never need all
+    results in memory. Aggregators built by parallel workers combine with
+    merge(). Latency percentiles come from a DDSketch (within 1% of
+    np.percentile); means, std, min and max are exact.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.total = 0
+        self.metrics = {name: RunningStats() for name in METRIC_WEIGHTS}
+        self.response_time = RunningStats()
+        self.response_time_sketch = DDSketch(relative_accuracy)
+        self.cost = RunningStats()
+        self.errors: List[Dict[str, str]] = []
+
+    def add(self, result: EvaluationResult):
+        self.total += 1
+        if result.error is not None:
+            self.errors.append({'query': result.query, 'error': result.error})
+            return
+
+        for name, stats in self.metrics.items():
+            stats.add(getattr(result, name))
+        self.response_time.add(result.response_time)
+        self.response_time_sketch.add(result.response_time)
+        self.cost.add(result.cost)
+
+    def update(self, results: Iterable[EvaluationResult]) -> "ReportAggregator":
+        for result in results:
+            self.add(result)
+        return self
+
+    def merge(self, other: "ReportAggregator") -> "ReportAggregator":
+        self.total += other.total
+        for name, stats in self.metrics.items():
+            stats.merge(other.metrics[name])
+        self.response_time.merge(other.response_time)
+        self.response_time_sketch.merge(other.response_time_sketch)
+        self.cost.merge(other.cost)
+        self.errors.extend(other.errors)
+        return self
+
+    def report(self) -> Dict[str, Any]:
+        """Report dict (see RAGASEvaluator.generate_report)"""
+        if not self.total:
+            return {'error': 'No results to report'}
+
+        successful = self.response_time.count
+        if not successful:
+            return {'error': 'All evaluations failed'}
+
+        report = {
+            'total_queries': self.total,
+            'successful_queries': successful,
+            'error_rate': 1.0 - successful / self.total,
+
+            'metrics': {
+                name: {
+                    'mean': stats.mean,
+                    'std': stats.std,
+                    'min': stats.min,
+                    'max': stats.max
+                }
+                for name, stats in self.metrics.items()
+            },
+
+            'performance': {
+                'avg_response_time': self.response_time.mean,
+                'p50_response_time': self.response_time_sketch.quantile(0.50),
+                'p95_response_time': self.response_time_sketch.quantile(0.95),
+                'avg_cost': self.cost.mean,
+                'total_cost': self.cost.total
+            },
+
+            'errors': list(self.errors)
+        }
+
+        # Calculate overall score
+        report['overall_score'] = sum(
+            report['metrics'][name]['mean'] * weight
+            for name, weight in METRIC_WEIGHTS.items()
+        ) * 100
+
+        return report
+
+
 class RAGASEvaluator:
     """
     RAGAS (Retrieval Augmented Generation Assessment) Evaluator
@@ -41,8 +268,32 @@ class RAGASEvaluator:
     4. Answer Relevancy: Answer quality
     """
 
-    def __init__(self, embedding_model: str = "BAAI/bge-large-en-v1.5"):
-        self.embedder = SentenceTransformer(embedding_model)
+    def __init__(
+        self,
+        embedding_model: str = "BAAI/bge-large-en-v1.5",
+        embedder: Optional[Any] = None,
+        context_query_threshold: float = 0.5,
+        context_gt_threshold: float = 0.6,
+        grounding_threshold: float = 0.7
+    ):
+        """
+        Args:
+            embedding_model: SentenceTransformer model name, resolved through
+                the shared embedder registry (loaded on first encode, one
+                instance per process, shared with GraphRAG)
+            embedder: Explicit embedder with SentenceTransformer's encode()
+                (e.g. a HashingEmbedder stub); overrides embedding_model
+            context_query_threshold: Context precision - a context is
+                relevant if its similarity to the query is above this...
+            context_gt_threshold: ...or its similarity to the ground truth
+                is above this
+            grounding_threshold: Faithfulness - a response sentence is
+                grounded if its similarity to some context is above this
+        """
+        self.embedder = embedder if embedder is not None else get_embedder(embedding_model)
+        self.context_query_threshold = context_query_threshold
+        self.context_gt_threshold = context_gt_threshold
+        self.grounding_threshold = grounding_threshold
 
     def evaluate(
         self,
@@ -67,166 +318,93 @@ class RAGASEvaluator:
         Returns:
             EvaluationResult with all metrics
         """
-        try:
-            # Calculate metrics
-            context_precision = self._calculate_context_precision(
-                query, retrieved_contexts, ground_truth
-            )
-
-            context_recall = self._calculate_context_recall(
-                retrieved_contexts, ground_truth
-            )
-
-            faithfulness = self._calculate_faithfulness(
-                response, retrieved_contexts
-            )
-
-            answer_relevancy = self._calculate_answer_relevancy(
-                query, response
-            )
-
-            return EvaluationResult(
-                query=query,
-                response=response,
-                retrieved_contexts=retrieved_contexts,
-                ground_truth=ground_truth,
-                context_precision=context_precision,
-                context_recall=context_recall,
-                faithfulness=faithfulness,
-                answer_relevancy=answer_relevancy,
-                response_time=response_time,
-                cost=cost
-            )
-
-        except Exception as e:
-            return EvaluationResult(
-                query=query,
-                response=response,
-                retrieved_contexts=retrieved_contexts,
-                ground_truth=ground_truth,
-                context_precision=0.0,
-                context_recall=0.0,
-                faithfulness=0.0,
-                answer_relevancy=0.0,
-                response_time=response_time,
-                cost=cost,
-                error=str(e)
-            )
-
-    def _calculate_context_precision(
+        # A batch of one: same encode and metric kernels as batch_evaluate
+        return self.batch_evaluate(
+            [{
+                'query': query,
+                'response': response,
+                'retrieved_contexts': retrieved_contexts,
+                'ground_truth': ground_truth,
+                'response_time': response_time,
+                'cost': cost
+            }],
+            encode_batch_size=None
+        )[0]
+
+    def _encode_unique(
         self,
-        query: str,
-        contexts: List[str],
-        ground_truth: str
-    ) -> float:
+        texts: Iterable[str],
+        batch_size: Optional[int] = None
+    ) -> Tuple[np.ndarray, Dict[str, int]]:
         """
-        Context Precision: Proportion of retrieved contexts that are relevant
-
-        Formula: (# relevant contexts) / (# retrieved contexts)
-        """
-        if not contexts:
-            return 0.0
-
-        # Embed query and contexts
-        query_emb = self.embedder.encode(query)
-        gt_emb = self.embedder.encode(ground_truth)
-        context_embs = self.embedder.encode(contexts)
-
-        # Calculate relevance scores
-        relevant_count = 0
-
-        for ctx_emb in context_embs:
-            # Cosine similarity with query
-            query_sim = np.dot(query_emb, ctx_emb) / (
-                np.linalg.norm(query_emb) * np.linalg.norm(ctx_emb)
-            )
-
-            # Cosine similarity with ground truth
-            gt_sim = np.dot(gt_emb, ctx_emb) / (
-                np.linalg.norm(gt_emb) * np.linalg.norm(ctx_emb)
-            )
+        Encode each distinct text once
 
-            # Relevant if similarity is high enough
-            if query_sim > 0.5 or gt_sim > 0.6:
-                relevant_count += 1
-
-        return relevant_count / len(contexts)
+        Args:
+            texts: Strings to embed (duplicates are encoded once)
+            batch_size: Texts per encode call (None: one call). Texts are
+                sorted by length first so each batch pads to similar lengths.
 
-    def _calculate_context_recall(
-        self,
-        contexts: List[str],
-        ground_truth: str
-    ) -> float:
+        Returns:
+            (L2-normalized float32 matrix, text -> row), so cosine
+            similarity between rows is a plain dot product
         """
-        Context Recall: Proportion of ground truth covered by retrieved contexts
-
-        Measures: How much of the correct answer can be found in retrieved contexts?
+        unique = list(dict.fromkeys(texts))
+        rows = {text: row for row, text in enumerate(unique)}
+        if not unique:
+            return np.zeros((0, 0), dtype=np.float32), rows
+
+        order = sorted(range(len(unique)), key=lambda row: len(unique[row]))
+        batch_size = batch_size or len(unique)
+
+        parts = []
+        for start in range(0, len(order), batch_size):
+            batch = [unique[row] for row in order[start:start + batch_size]]
+            embeddings = self.embedder.encode(batch, batch_size=len(batch))
+            parts.append(np.asarray(embeddings, dtype=np.float32).reshape(len(batch), -1))
+
+        matrix = np.empty((len(unique), parts[0].shape[1]), dtype=np.float32)
+        matrix[order] = np.concatenate(parts)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-12)
+        return matrix, rows
+
+    def _context_similarities(
+        self,
+        context_embs: np.ndarray,
+        query_embs: np.ndarray,
+        gt_embs: np.ndarray
+    ) -> np.ndarray:
         """
-        if not contexts:
-            return 0.0
-
-        # Embed ground truth and contexts
-        gt_emb = self.embedder.encode(ground_truth)
-        context_embs = self.embedder.encode(contexts)
+        Kernel: similarity of each context to its case's query and ground truth
 
-        # Find max similarity with any context
-        max_similarity = max(
-            np.dot(gt_emb, ctx_emb) / (
-                np.linalg.norm(gt_emb) * np.linalg.norm(ctx_emb)
-            )
-            for ctx_emb in context_embs
-        )
+        Args:
+            context_embs: (n_contexts, dim) normalized context embeddings
+            query_embs, gt_embs: (n_contexts, dim) query / ground truth
+                embedding of the case each context belongs to
 
-        return float(max_similarity)
+        Returns:
+            (n_contexts, 2) array of [query similarity, ground truth similarity]
+        """
+        targets = np.stack([query_embs, gt_embs], axis=1)
+        return np.einsum('cd,ctd->ct', context_embs, targets)
 
     def _calculate_faithfulness(
         self,
-        response: str,
-        contexts: List[str]
+        sentence_embs: np.ndarray,
+        context_embs: np.ndarray
     ) -> float:
         """
         Faithfulness: Degree to which response is grounded in retrieved contexts
 
         Measures: Does the answer come from the contexts or is it hallucinated?
+        Kernel: one sentences x contexts product; a sentence is grounded if
+        its row max is above grounding_threshold.
         """
-        if not contexts:
-            return 0.0
-
-        # Split response into sentences
-        sentences = self._split_sentences(response)
-
-        if not sentences:
+        if not len(context_embs) or not len(sentence_embs):
             return 0.0
 
-        # Check each sentence against contexts
-        grounded_count = 0
-
-        for sentence in sentences:
-            if self._is_grounded(sentence, contexts):
-                grounded_count += 1
-
-        return grounded_count / len(sentences)
-
-    def _calculate_answer_relevancy(
-        self,
-        query: str,
-        response: str
-    ) -> float:
-        """
-        Answer Relevancy: How relevant is the response to the query?
-
-        Measures: Does the answer address the question?
-        """
-        # Embed query and response
-        query_emb = self.embedder.encode(query)
-        response_emb = self.embedder.encode(response)
-
-        # Cosine similarity
-        similarity = np.dot(query_emb, response_emb) / (
-            np.linalg.norm(query_emb) * np.linalg.norm(response_emb)
-        )
-
-        return float(similarity)
+        best_support = (sentence_embs @ context_embs.T).max(axis=1)
+        return float(np.mean(best_support > self.grounding_threshold))
 
     def _split_sentences(self, text: str) -> List[str]:
         """Simple sentence splitter"""
@@ -240,32 +418,19 @@ class RAGASEvaluator:
 
         return sentences
 
-    def _is_grounded(self, sentence: str, contexts: List[str]) -> bool:
-        """Check if sentence is grounded in any context"""
-        # Embed sentence
-        sent_emb = self.embedder.encode(sentence)
-
-        # Check against all contexts
-        for context in contexts:
-            ctx_emb = self.embedder.encode(context)
-
-            similarity = np.dot(sent_emb, ctx_emb) / (
-                np.linalg.norm(sent_emb) * np.linalg.norm(ctx_emb)
-            )
-
-            # Threshold for grounding
-            if similarity > 0.7:
-                return True
-
-        return False
-
     def batch_evaluate(
         self,
-        test_cases: List[Dict[str, Any]]
+        test_cases: List[Dict[str, Any]],
+        encode_batch_size: Optional[int] = 256
     ) -> List[EvaluationResult]:
         """
         Evaluate multiple test cases
 
+        Strings are deduplicated across the whole dataset (contexts are
+        often shared between cases), encoded in length-sorted batches of
+        encode_batch_size, and the metrics of all cases are computed with
+        array operations over the shared embedding matrix.
+
         Args:
             test_cases: List of dicts with keys:
                 - query: str
@@ -274,97 +439,154 @@ class RAGASEvaluator:
                 - ground_truth: str
                 - response_time: float (optional)
                 - cost: float (optional)
+            encode_batch_size: Texts per embedder.encode call (None: one call)
 
         Returns:
             List of EvaluationResult
         """
-        results = []
-
+        cases = []
         for test_case in test_cases:
-            result = self.evaluate(
-                query=test_case['query'],
-                response=test_case['response'],
-                retrieved_contexts=test_case['retrieved_contexts'],
-                ground_truth=test_case['ground_truth'],
-                response_time=test_case.get('response_time', 0.0),
-                cost=test_case.get('cost', 0.0)
+            if not isinstance(test_case, dict):
+                test_case = {}
+            case = {key: test_case.get(key) for key in REQUIRED_CASE_KEYS}
+            case['response_time'] = test_case.get('response_time', 0.0)
+            case['cost'] = test_case.get('cost', 0.0)
+
+            # Validate per case, so a malformed case only fails itself
+            try:
+                missing = [key for key in REQUIRED_CASE_KEYS if key not in test_case]
+                if missing:
+                    raise ValueError(f"missing {', '.join(missing)}")
+                for key in ('response_time', 'cost'):
+                    if isinstance(case[key], bool) or not isinstance(case[key], (int, float)):
+                        raise TypeError(f"{key} must be a number, got {type(case[key]).__name__}")
+                for key in ('query', 'response', 'ground_truth'):
+                    if not isinstance(case[key], str):
+                        raise TypeError(f"{key} must be a str, got {type(case[key]).__name__}")
+                if isinstance(case['retrieved_contexts'], str):
+                    raise TypeError("retrieved_contexts must be a list of str, got a str")
+                case['contexts'] = list(case['retrieved_contexts'] or [])
+                for context in case['contexts']:
+                    if not isinstance(context, str):
+                        raise TypeError(f"retrieved_contexts must hold str, got {type(context).__name__}")
+                case['sentences'] = self._split_sentences(case['response'])
+            except Exception as e:
+                case['error'] = str(e)
+                for key in ('response_time', 'cost'):
+                    if not isinstance(case[key], (int, float)):
+                        case[key] = 0.0
+            cases.append(case)
+
+        valid = [case for case in cases if 'error' not in case]
+        # Only encoder failures reach here; they affect the whole batch
+        try:
+            matrix, rows = self._encode_unique(
+                (
+                    text
+                    for case in valid
+                    for text in [case['query'], case['response'], case['ground_truth']]
+                    + case['contexts'] + case['sentences']
+                ),
+                batch_size=encode_batch_size
             )
-            results.append(result)
-
-        return results
+            scores = self._score_cases(valid, matrix, rows)
+        except Exception as e:
+            for case in valid:
+                case['error'] = str(e)
+        else:
+            for case, case_scores in zip(valid, scores):
+                case.update(case_scores)
+
+        return [
+            EvaluationResult(
+                query=case['query'],
+                response=case['response'],
+                retrieved_contexts=case['retrieved_contexts'],
+                ground_truth=case['ground_truth'],
+                context_precision=case.get('context_precision', 0.0),
+                context_recall=case.get('context_recall', 0.0),
+                faithfulness=case.get('faithfulness', 0.0),
+                answer_relevancy=case.get('answer_relevancy', 0.0),
+                response_time=case['response_time'],
+                cost=case['cost'],
+                error=case.get('error')
+            )
+            for case in cases
+        ]
 
-    def generate_report(self, results: List[EvaluationResult]) -> Dict[str, Any]:
+    def _score_cases(
+        self,
+        cases: List[Dict[str, Any]],
+        matrix: np.ndarray,
+        rows: Dict[str, int]
+    ) -> List[Dict[str, float]]:
         """
-        Generate comprehensive evaluation report
-
-        Returns:
-            Report dict with aggregate metrics
+        All four metrics for many cases at once
+
+        Contexts of all cases are laid out back to back (one segment per
+        case), so query/ground-truth similarities are one contexts x
+        {query, ground truth} kernel over all contexts, and per-case
+        precision (share of relevant contexts) and recall (max ground
+        truth similarity) are segment reductions. Faithfulness needs a
+        sentences x contexts block per case.
         """
-        if not results:
-            return {'error': 'No results to report'}
-
-        # Filter out errors
-        valid_results = [r for r in results if r.error is None]
-
-        if not valid_results:
-            return {'error': 'All evaluations failed'}
-
-        # Calculate aggregate metrics
-        report = {
-            'total_queries': len(results),
-            'successful_queries': len(valid_results),
-            'error_rate': 1.0 - len(valid_results) / len(results),
+        n_cases = len(cases)
+        if not n_cases:
+            return []
+
+        query_embs = matrix[[rows[case['query']] for case in cases]]
+        response_embs = matrix[[rows[case['response']] for case in cases]]
+        gt_embs = matrix[[rows[case['ground_truth']] for case in cases]]
+        answer_relevancy = np.einsum('ij,ij->i', query_embs, response_embs)
+
+        counts = np.array([len(case['contexts']) for case in cases])
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        context_embs = matrix[[rows[context] for case in cases for context in case['contexts']]]
+
+        context_precision = np.zeros(n_cases)
+        context_recall = np.zeros(n_cases)
+        has_contexts = counts > 0
+        if has_contexts.any():
+            owner = np.repeat(np.arange(n_cases), counts)
+            sims = self._context_similarities(context_embs, query_embs[owner], gt_embs[owner])
+            query_sims, gt_sims = sims[:, 0], sims[:, 1]
+            relevant = (
+                (query_sims > self.context_query_threshold) | (gt_sims > self.context_gt_threshold)
+            ).astype(np.float64)
+
+            # Empty segments are skipped, so each start runs to the next non-empty case
+            segment_starts = starts[has_contexts]
+            context_precision[has_contexts] = (
+                np.add.reduceat(relevant, segment_starts) / counts[has_contexts]
+            )
+            context_recall[has_contexts] = np.maximum.reduceat(gt_sims, segment_starts)
 
-            'metrics': {
-                'context_precision': {
-                    'mean': np.mean([r.context_precision for r in valid_results]),
-                    'std': np.std([r.context_precision for r in valid_results]),
-                    'min': np.min([r.context_precision for r in valid_results]),
-                    'max': np.max([r.context_precision for r in valid_results])
-                },
-                'context_recall': {
-                    'mean': np.mean([r.context_recall for r in valid_results]),
-                    'std': np.std([r.context_recall for r in valid_results]),
-                    'min': np.min([r.context_recall for r in valid_results]),
-                    'max': np.max([r.context_recall for r in valid_results])
-                },
-                'faithfulness': {
-                    'mean': np.mean([r.faithfulness for r in valid_results]),
-                    'std': np.std([r.faithfulness for r in valid_results]),
-                    'min': np.min([r.faithfulness for r in valid_results]),
-                    'max': np.max([r.faithfulness for r in valid_results])
-                },
-                'answer_relevancy': {
-                    'mean': np.mean([r.answer_relevancy for r in valid_results]),
-                    'std': np.std([r.answer_relevancy for r in valid_results]),
-                    'min': np.min([r.answer_relevancy for r in valid_results]),
-                    'max': np.max([r.answer_relevancy for r in valid_results])
-                }
-            },
+        scores = []
+        for i, case in enumerate(cases):
+            sentence_embs = matrix[[rows[sentence] for sentence in case['sentences']]]
+            faithfulness = self._calculate_faithfulness(
+                sentence_embs, context_embs[starts[i]:starts[i] + counts[i]]
+            )
+            scores.append({
+                'context_precision': float(context_precision[i]),
+                'context_recall': float(context_recall[i]),
+                'faithfulness': faithfulness,
+                'answer_relevancy': float(answer_relevancy[i])
+            })
 
-            'performance': {
-                'avg_response_time': np.mean([r.response_time for r in valid_results]),
-                'p50_response_time': np.percentile([r.response_time for r in valid_results], 50),
-                'p95_response_time': np.percentile([r.response_time for r in valid_results], 95),
-                'avg_cost': np.mean([r.cost for r in valid_results]),
-                'total_cost': np.sum([r.cost for r in valid_results])
-            },
+        return scores
 
-            'errors': [
-                {'query': r.query, 'error': r.error}
-                for r in results if r.error is not None
-            ]
-        }
+    def generate_report(self, results: Iterable[EvaluationResult]) -> Dict[str, Any]:
+        """
+        Generate comprehensive evaluation report
 
-        # Calculate overall score
-        report['overall_score'] = (
-            report['metrics']['context_precision']['mean'] * 0.2 +
-            report['metrics']['context_recall']['mean'] * 0.2 +
-            report['metrics']['faithfulness']['mean'] * 0.3 +
-            report['metrics']['answer_relevancy']['mean'] * 0.3
-        ) * 100
+        Results are consumed in one streaming pass (see ReportAggregator),
+        so any iterable works, e.g. a generator over a results file.
 
-        return report
+        Returns:
+            Report dict with aggregate metrics
+        """
+        return ReportAggregator().update(results).report()
 
 
 # Example usage
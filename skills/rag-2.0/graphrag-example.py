@@ -2,10 +2,1684 @@
 # Knowledge Graph + RAG for complex multi-hop queries
 
 import networkx as nx
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
+import asyncio
+import bisect
+import functools
+import heapq
+import itertools
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Sequence, Set, Tuple
 import numpy as np
 
+# Process-wide embedder registry shared with the other skills (skills/_shared)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "_shared"))
+from embedder_registry import get_embedder
+
+
+# Bump when the save() layout changes
+SNAPSHOT_VERSION = 4
+
+# EntityIndex storage types
+STORAGE_DTYPES = {
+    'float32': np.float32,
+    'float16': np.float16,
+    'int8': np.int8
+}
+
+# Rows per chunk when scoring quantized storage (sized to stay in cache)
+SCORE_CHUNK_ROWS = 1024
+
+# IVF k-means: training sample points per list (capped overall), and the
+# rows x centroids score block size used for assignments
+KMEANS_POINTS_PER_LIST = 64
+KMEANS_MAX_SAMPLE = 65536
+KMEANS_BLOCK_SCORES = 1 << 22
+
+# query(retrieval=...): embedding search only, or fused with LexicalIndex
+RETRIEVAL_MODES = ("vector", "hybrid")
+
+# Reciprocal rank fusion constant and candidates per ranking (x top_k)
+RRF_K = 60
+HYBRID_CANDIDATE_FACTOR = 4
+
+
+class EntityIndex:
+    """
+    Contiguous entity embedding store for similarity search
+
+    Embeddings are L2-normalized once on insert and kept in a single
+    matrix, so scoring a query against every entity is one
+    matrix-vector product.
+
+    Storage dtypes:
+        float32: Exact (default)
+        float16: Half the memory, but scans are several times slower
+                 than float32 (numpy's half conversion is slow); use it
+                 only when memory, not latency, is the constraint
+        int8:    Quarter the memory; per-vector scale, the int8 codes are
+                 dotted with the query and the scale is applied to the
+                 resulting score instead of dequantizing the matrix
+
+    With rescore_factor set, a quantized search takes top_k *
+    rescore_factor candidates and rescores them against full-precision
+    vectors. Those are never held in RAM: in-memory ingestion writes them
+    to a memory-mapped file (rescore_path, or an anonymous temporary
+    file), and after GraphRAG.load(mmap=True) they stay in the
+    memory-mapped snapshot. Only the candidate rows are read.
+
+    This is the exact backend and also the interface (add / search /
+    len) that approximate backends such as IVFEntityIndex implement.
+    """
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        initial_capacity: int = 1024,
+        dtype: str = "float32",
+        rescore_factor: Optional[int] = None,
+        rescore_path: Optional[str] = None
+    ):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown dtype: {dtype} (choose from {list(STORAGE_DTYPES)})")
+
+        self.dim = dim
+        self.dtype = dtype
+        self.rescore_factor = rescore_factor if dtype != "float32" else None
+        self._capacity = initial_capacity
+        self._matrix: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self.rescore_path = rescore_path
+        self._full: Optional[np.ndarray] = None
+        self._full_file: Optional[Any] = None
+        self._full_owned = False
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._rows
+
+    @property
+    def ids(self) -> List[str]:
+        """Entity ids in row order"""
+        return self._ids
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        Normalized float32 embeddings, one row per entity
+
+        A view for float32 storage; quantized storage returns a
+        dequantized copy (use vectors(rows) for a subset).
+        """
+        if self._matrix is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        if self.dtype == "float32":
+            return self._matrix[:len(self._ids)]
+        return self.vectors(np.arange(len(self._ids)))
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Normalized float32 embeddings for the given rows"""
+        if self._full is not None:
+            return np.asarray(self._full[rows], dtype=np.float32)
+        stored = np.asarray(self._matrix[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            stored *= self._scales[rows][:, None]
+        return stored
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the embedding arrays (excluding memory maps)"""
+        return sum(
+            array[:len(self._ids)].nbytes
+            for array in (self._matrix, self._scales, self._full)
+            if array is not None and not isinstance(array, np.memmap)
+        )
+
+    def add(self, entity_ids: Sequence[str], embeddings: np.ndarray):
+        """
+        Insert or overwrite entity embeddings
+
+        Args:
+            entity_ids: Entity ids, one per row of embeddings
+            embeddings: (n, dim) array of raw (unnormalized) embeddings
+        """
+        vectors = _normalize_rows(np.atleast_2d(embeddings))
+        if len(entity_ids) != len(vectors):
+            raise ValueError("entity_ids and embeddings must have the same length")
+
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Embedding dim {vectors.shape[1]} does not match index dim {self.dim}"
+            )
+
+        new_ids = [entity_id for entity_id in entity_ids if entity_id not in self._rows]
+        self._reserve(len(self._ids) + len(set(new_ids)))
+
+        rows = []
+        for entity_id in entity_ids:
+            row = self._rows.get(entity_id)
+            if row is None:
+                row = len(self._ids)
+                self._rows[entity_id] = row
+                self._ids.append(entity_id)
+            rows.append(row)
+
+        # Later duplicates win, as with sequential assignment
+        self._store(np.array(rows, dtype=np.int64), vectors)
+
+    def load_arrays(
+        self,
+        entity_ids: Sequence[str],
+        matrix: np.ndarray,
+        state: Optional[Dict[str, np.ndarray]] = None
+    ):
+        """
+        Replace the index contents with already-normalized embeddings
+
+        For float32 storage, matrix may be a read-only memory map; it is
+        only copied into a private buffer when new entities are added
+        later. state is a saved state_arrays() for the same rows. Quantized storage encodes it in chunks and, when
+        rescoring, keeps matrix itself as the full-precision source.
+        """
+        if len(entity_ids) != len(matrix):
+            raise ValueError("entity_ids and matrix must have the same length")
+
+        self._ids = list(entity_ids)
+        self._rows = {entity_id: row for row, entity_id in enumerate(self._ids)}
+        self._matrix = self._scales = self._full = None
+        self._full_owned = False
+        if not len(matrix):
+            return
+
+        self.dim = matrix.shape[1]
+        if self.dtype == "float32":
+            self._matrix = matrix
+            return
+
+        self._matrix = np.empty((len(matrix), self.dim), dtype=STORAGE_DTYPES[self.dtype])
+        if self.dtype == "int8":
+            self._scales = np.empty(len(matrix), dtype=np.float32)
+        for begin in range(0, len(matrix), 65536):
+            rows = np.arange(begin, min(begin + 65536, len(matrix)))
+            self._store(rows, np.asarray(matrix[rows], dtype=np.float32), keep_full=False)
+        if self.rescore_factor:
+            self._full = matrix
+            if not isinstance(matrix, np.memmap):
+                # In-RAM snapshot (mmap=False): move it to the rescoring file
+                self._full = self._grown_full(len(matrix), len(matrix))
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        """Derived search state to persist with the embeddings (none here)"""
+        return {}
+
+    def similarities(self, query_embedding: np.ndarray, entity_ids: Iterable[str]) -> Dict[str, float]:
+        """Cosine similarity of the query to each given (indexed) entity"""
+        rows = {entity_id: self._rows[entity_id] for entity_id in entity_ids if entity_id in self._rows}
+        if not rows:
+            return {}
+
+        query = _normalize_rows(np.atleast_2d(query_embedding))[0]
+        scores = self.vectors(np.array(list(rows.values()), dtype=np.int64)) @ query
+        return dict(zip(rows, scores.tolist()))
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Find the top_k entities by cosine similarity
+
+        Args:
+            query_embedding: Raw query embedding
+            top_k: Number of results
+            rows: Optional candidate row indices to restrict the search to
+
+        Returns:
+            List of (entity_id, similarity), best first
+        """
+        if not self._ids or top_k <= 0:
+            return []
+
+        query = _normalize_rows(np.atleast_2d(query_embedding))[0]
+        return self._search_rows(query, top_k, rows)
+
+    def rows_for(self, entity_ids: Iterable[str]) -> np.ndarray:
+        """Row indices of the given entities (unindexed ids are skipped)"""
+        return np.array(
+            [self._rows[entity_id] for entity_id in entity_ids if entity_id in self._rows],
+            dtype=np.int64
+        )
+
+    def _search_rows(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        rows: Optional[np.ndarray]
+    ) -> List[Tuple[str, float]]:
+        """Top-k over all rows or a candidate subset, with optional rescoring"""
+        scores = self._scores(query, rows)
+        candidates = _top_k_indices(scores, top_k * (self.rescore_factor or 1))
+        if rows is not None:
+            candidates = rows[candidates]
+
+        if self.rescore_factor:
+            scores = self.vectors(candidates) @ query
+            order = _top_k_indices(scores, top_k)
+            return [(self._ids[candidates[i]], float(scores[i])) for i in order]
+
+        if rows is None:
+            return [(self._ids[row], float(scores[row])) for row in candidates]
+        position = {row: i for i, row in enumerate(rows.tolist())}
+        return [(self._ids[row], float(scores[position[row]])) for row in candidates.tolist()]
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Similarity of query to all rows (or the given rows) from stored codes"""
+        stored = self._matrix[:len(self._ids)] if rows is None else self._matrix[rows]
+        if self.dtype == "float32":
+            return stored @ query
+
+        # Upcast one cache-sized chunk at a time into a reused buffer, so
+        # no float32 copy of the matrix is ever materialized
+        scores = np.empty(len(stored), dtype=np.float32)
+        buffer = np.empty((min(SCORE_CHUNK_ROWS, len(stored)), self.dim), dtype=np.float32)
+        for begin in range(0, len(stored), SCORE_CHUNK_ROWS):
+            chunk = stored[begin:begin + SCORE_CHUNK_ROWS]
+            np.copyto(buffer[:len(chunk)], chunk, casting='unsafe')
+            np.dot(buffer[:len(chunk)], query, out=scores[begin:begin + len(chunk)])
+
+        if self.dtype == "int8":
+            scores *= self._scales[:len(self._ids)] if rows is None else self._scales[rows]
+        return scores
+
+    def _store(self, rows: np.ndarray, vectors: np.ndarray, keep_full: bool = True):
+        """Write normalized float32 vectors into the storage dtype"""
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._matrix[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[rows] = scales
+        else:
+            self._matrix[rows] = vectors
+
+        if keep_full and self._full is not None:
+            self._full[rows] = vectors
+
+    def _reserve(self, size: int):
+        """Grow the backing arrays (amortized doubling) to hold size rows"""
+        arrays = [a for a in (self._matrix, self._scales, self._full) if a is not None]
+        if (
+            self._matrix is not None
+            and size <= len(self._matrix)
+            and all(a.flags.writeable for a in arrays)
+        ):
+            return
+
+        capacity = max(self._capacity, len(self._matrix) if self._matrix is not None else 0)
+        while capacity < size:
+            capacity *= 2
+
+        n = len(self._ids)
+        self._matrix = _grown(self._matrix, (capacity, self.dim), STORAGE_DTYPES[self.dtype], n)
+        if self.dtype == "int8":
+            self._scales = _grown(self._scales, (capacity,), np.float32, n)
+        if self.rescore_factor:
+            self._full = self._grown_full(capacity, n)
+
+    def _grown_full(self, capacity: int, n: int) -> np.memmap:
+        """
+        File-backed float32 rescoring vectors with room for capacity rows
+
+        Growing our own file only extends and remaps it; the first n rows
+        of any other source (e.g. a read-only snapshot map) are copied in
+        chunks.
+        """
+        if self._full_file is None:
+            self._full_file = (
+                open(self.rescore_path, "w+b") if self.rescore_path else tempfile.TemporaryFile()
+            )
+        previous, owned = self._full, self._full_owned
+        if not owned:
+            self._full_file.truncate(0)
+        self._full_file.truncate(capacity * self.dim * np.dtype(np.float32).itemsize)
+        grown = np.memmap(self._full_file, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        if previous is not None and not owned:
+            for begin in range(0, n, 65536):
+                grown[begin:min(begin + 65536, n)] = previous[begin:min(begin + 65536, n)]
+        self._full_owned = True
+        return grown
+
+
+class IVFEntityIndex(EntityIndex):
+    """
+    Inverted-file (IVF) approximate index over EntityIndex storage
+
+    Entities are clustered with spherical k-means; a query scores the
+    centroids first and then scans only the n_probe closest lists.
+    Below min_train_size the index stays untrained and falls back to
+    the exact scan.
+
+    Knobs:
+        n_lists: Number of clusters (default: 4 * sqrt(N) at train time)
+        n_probe: Lists scanned per query - higher is slower, better recall
+        min_train_size: Entity count at which IVF kicks in
+        retrain_growth: Retrain when the index grows by this factor
+    """
+
+    def __init__(
+        self,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        min_train_size: int = 10000,
+        retrain_growth: float = 2.0,
+        kmeans_iters: int = 10,
+        seed: int = 0,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.retrain_growth = retrain_growth
+        self.kmeans_iters = kmeans_iters
+        self.seed = seed
+
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        self._assignment: List[int] = []
+        self._lists: List[List[int]] = []
+        self._list_arrays: List[Optional[np.ndarray]] = []
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def add(self, entity_ids: Sequence[str], embeddings: np.ndarray):
+        start = len(self._ids)
+        updated = sorted({self._rows[i] for i in entity_ids if i in self._rows})
+        super().add(entity_ids, embeddings)
+
+        if not self.is_trained:
+            if len(self) >= self.min_train_size:
+                self.train()
+            return
+
+        if len(self) >= self._trained_size * self.retrain_growth:
+            self.train()
+            return
+
+        # Incremental insert: route new/updated rows to their nearest list
+        rows = np.array(updated + list(range(start, len(self._ids))), dtype=np.int64)
+        self._assign_rows(rows)
+
+    def load_arrays(
+        self,
+        entity_ids: Sequence[str],
+        matrix: np.ndarray,
+        state: Optional[Dict[str, np.ndarray]] = None
+    ):
+        """Replace the index contents, reusing saved centroids when given"""
+        super().load_arrays(entity_ids, matrix)
+        self._centroids = None
+        if state and 'centroids' in state and len(state['assignment']) == len(self):
+            self._centroids = np.asarray(state['centroids'], dtype=np.float32)
+            self._trained_size = int(state['trained_size'])
+            self._set_lists(np.asarray(state['assignment'], dtype=np.int64))
+        elif len(self) >= self.min_train_size:
+            self.train()
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        """Centroids and list assignment, so a load skips k-means"""
+        if not self.is_trained:
+            return {}
+        return {
+            'centroids': self._centroids,
+            'assignment': np.array(self._assignment, dtype=np.int32),
+            'trained_size': np.array(self._trained_size, dtype=np.int64)
+        }
+
+
+    def train(self):
+        """(Re)build centroids and inverted lists from the current entities"""
+        size = len(self)
+        n_lists = self.n_lists or int(4 * np.sqrt(size))
+        n_lists = max(1, min(n_lists, size))
+
+        # K-means on a bounded sample
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(size, n_lists * KMEANS_POINTS_PER_LIST, KMEANS_MAX_SAMPLE)
+        sample = np.sort(rng.choice(size, max(sample_size, n_lists), replace=False))
+        self._centroids = _spherical_kmeans(
+            self.vectors(sample), n_lists, self.kmeans_iters, rng
+        )
+        self._trained_size = size
+
+        assignment = np.concatenate([
+            _nearest_centroids(
+                self.vectors(np.arange(begin, min(begin + 65536, size))),
+                self._centroids
+            )
+            for begin in range(0, size, 65536)
+        ])
+        self._set_lists(assignment)
+
+    def _set_lists(self, assignment: np.ndarray):
+        """Build the inverted lists from a row -> list assignment"""
+        n_lists = len(self._centroids)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+
+        self._assignment = assignment.tolist()
+        self._list_arrays = [order[bounds[i]:bounds[i + 1]] for i in range(n_lists)]
+        self._lists = [array.tolist() for array in self._list_arrays]
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        rows: Optional[np.ndarray] = None,
+        n_probe: Optional[int] = None
+    ) -> List[Tuple[str, float]]:
+        # Restricted candidate sets are small enough to scan exactly
+        n_probe = n_probe or self.n_probe
+        if rows is not None or not self.is_trained or n_probe >= len(self._centroids):
+            return super().search(query_embedding, top_k, rows=rows)
+        if top_k <= 0:
+            return []
+
+        query = _normalize_rows(np.atleast_2d(query_embedding))[0]
+        probes = _top_k_indices(self._centroids @ query, n_probe)
+        candidates = np.concatenate([self._list_array(i) for i in probes])
+        if len(candidates) == 0:
+            return []
+
+        return self._search_rows(query, top_k, candidates)
+
+    def _assign_rows(self, rows: np.ndarray, chunk_size: int = 65536):
+        """Move rows to the list of their nearest centroid"""
+        for begin in range(0, len(rows), chunk_size):
+            chunk = rows[begin:begin + chunk_size]
+            nearest = _nearest_centroids(self.vectors(chunk), self._centroids)
+
+            for row, list_id in zip(chunk.tolist(), nearest.tolist()):
+                if row < len(self._assignment):
+                    previous = self._assignment[row]
+                    if previous == list_id:
+                        continue
+                    self._lists[previous].remove(row)
+                    self._list_arrays[previous] = None
+                    self._assignment[row] = list_id
+                else:
+                    self._assignment.append(list_id)
+
+                self._lists[list_id].append(row)
+                self._list_arrays[list_id] = None
+
+    def _list_array(self, list_id: int) -> np.ndarray:
+        """Cached array view of an inverted list"""
+        array = self._list_arrays[list_id]
+        if array is None:
+            array = np.array(self._lists[list_id], dtype=np.int64)
+            self._list_arrays[list_id] = array
+        return array
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Index of the most similar centroid per row
+
+    Scores are computed in row blocks so the block x centroids matrix
+    stays around KMEANS_BLOCK_SCORES floats, whatever the row count.
+    """
+    block = max(1, KMEANS_BLOCK_SCORES // max(1, len(centroids)))
+    if len(vectors) <= block:
+        return np.argmax(vectors @ centroids.T, axis=1)
+    return np.concatenate([
+        np.argmax(vectors[begin:begin + block] @ centroids.T, axis=1)
+        for begin in range(0, len(vectors), block)
+    ])
+
+
+def _spherical_kmeans(
+    sample: np.ndarray,
+    k: int,
+    iterations: int,
+    rng: np.random.Generator
+) -> np.ndarray:
+    """
+    K-means on the unit sphere (cosine) over a training sample
+
+    Returns:
+        (k, dim) array of normalized centroids
+    """
+    sample_size = len(sample)
+    centroids = sample[rng.choice(sample_size, k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = _nearest_centroids(sample, centroids)
+        # Per-cluster sums via one sort + segmented reduction
+        order = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=k)
+        present = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[present]
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+
+        # Re-seed empty clusters with random sample points
+        empty = ~present
+        if empty.any():
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+
+        centroids = _normalize_rows(sums)
+
+    return centroids
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over entity names and descriptions
+
+    Complements embedding search: exact tokens such as product codes and
+    person names score highly here even when their embeddings are
+    unremarkable. exact_matches() finds entities whose full name occurs in
+    a question, which lets hybrid queries skip the question encode.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_name_tokens: int = 8):
+        """
+        Args:
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+            max_name_tokens: Longer names are not used for exact matching
+        """
+        self.k1 = k1
+        self.b = b
+        self.max_name_tokens = max_name_tokens
+
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._lengths: List[int] = []
+        self._total_length = 0
+        # term -> {row: term frequency}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # name tokens -> entity ids with that name
+        self._names: Dict[Tuple[str, ...], List[str]] = {}
+        self._longest_name = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._rows
+
+    def add(self, entity_id: str, name: str, description: str = ""):
+        """Index an entity (ignored if already indexed)"""
+        if entity_id in self._rows:
+            return
+
+        row = len(self._ids)
+        self._rows[entity_id] = row
+        self._ids.append(entity_id)
+
+        name_tokens = tuple(_tokenize(name))
+        tokens = list(name_tokens) + _tokenize(description)
+        self._lengths.append(len(tokens))
+        self._total_length += len(tokens)
+        for term, tf in Counter(tokens).items():
+            self._postings.setdefault(term, {})[row] = tf
+
+        if name_tokens and len(name_tokens) <= self.max_name_tokens:
+            self._names.setdefault(name_tokens, []).append(entity_id)
+            self._longest_name = max(self._longest_name, len(name_tokens))
+
+    def search(self, text: str, top_k: int) -> List[Tuple[str, float]]:
+        """
+        BM25 top_k entities for a query text
+
+        Returns:
+            List of (entity_id, score), best first
+        """
+        n_entities = len(self._ids)
+        if not n_entities:
+            return []
+        avg_length = self._total_length / n_entities or 1.0
+
+        scores: Dict[int, float] = {}
+        for term in set(_tokenize(text)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n_entities - df + 0.5) / (df + 0.5))
+            for row, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[row] / avg_length)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(self._ids[row], score) for row, score in best]
+
+    def exact_matches(self, text: str) -> List[str]:
+        """
+        Entities whose full name appears in text as a token sequence
+
+        Longer names win: tokens covered by a matched name are not
+        matched again by a shorter name inside it.
+        """
+        tokens = _tokenize(text)
+        covered = [False] * len(tokens)
+        matches: Dict[str, None] = {}
+
+        for length in range(min(self._longest_name, len(tokens)), 0, -1):
+            for start in range(len(tokens) - length + 1):
+                if any(covered[start:start + length]):
+                    continue
+                entity_ids = self._names.get(tuple(tokens[start:start + length]))
+                if entity_ids:
+                    matches.update(dict.fromkeys(entity_ids))
+                    covered[start:start + length] = [True] * length
+
+        return list(matches)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable state (see from_dict)"""
+        return {
+            'k1': self.k1,
+            'b': self.b,
+            'max_name_tokens': self.max_name_tokens,
+            'ids': self._ids,
+            'lengths': self._lengths,
+            'postings': {
+                term: [list(postings), list(postings.values())]
+                for term, postings in self._postings.items()
+            },
+            'names': [[list(tokens), entity_ids] for tokens, entity_ids in self._names.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "LexicalIndex":
+        index = cls(state['k1'], state['b'], state['max_name_tokens'])
+        index._ids = state['ids']
+        index._rows = {entity_id: row for row, entity_id in enumerate(index._ids)}
+        index._lengths = state['lengths']
+        index._total_length = sum(index._lengths)
+        index._postings = {
+            term: dict(zip(rows, tfs)) for term, (rows, tfs) in state['postings'].items()
+        }
+        index._names = {tuple(tokens): entity_ids for tokens, entity_ids in state['names']}
+        index._longest_name = max((len(tokens) for tokens in index._names), default=0)
+        return index
+
+
+def _tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _reciprocal_rank_fusion(rankings: List[List[str]], top_k: int, k: int = RRF_K) -> List[str]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, entity_id in enumerate(ranking, 1):
+            scores[entity_id] = scores.get(entity_id, 0.0) + 1.0 / (k + rank)
+    return [
+        entity_id
+        for entity_id, _ in heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+    ]
+
+
+def _edge_allowed(
+    data: Dict[str, Any],
+    min_confidence: Optional[float],
+    relations: Optional[Iterable[str]]
+) -> bool:
+    """Edge filter shared by expansion and path search"""
+    if min_confidence is not None and data.get('confidence', 1.0) < min_confidence:
+        return False
+    return relations is None or data.get('relation', 'related_to') in relations
+
+
+def _cache_key(question: str, params: Dict[str, Any]) -> Tuple:
+    """QueryCache key: the question followed by the query params"""
+    return (question,) + tuple(sorted(params.items()))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)"""
+    return max(1, len(text) // 4)
+
+
+def _grown(array: Optional[np.ndarray], shape: Tuple, dtype: Any, n: int) -> np.ndarray:
+    """New array of shape with the first n rows copied from array"""
+    grown = np.empty(shape, dtype=dtype)
+    if array is not None:
+        grown[:n] = array[:n]
+    return grown
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows as float32, leaving zero vectors untouched"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k scores, best first, via partial selection"""
+    if top_k < len(scores):
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class CSRGraph:
+    """
+    Compact directed graph: interned node ids + CSR adjacency
+
+    Node ids are interned to consecutive integers; out-edges live in
+    CSR arrays (indptr / indices) with columnar relation codes and
+    float64 confidences (returned exactly as stored, like networkx), a
+    few bytes per edge instead of networkx's nested dicts. New edges are buffered and merged into the CSR arrays on the
+    next read (re-adding an edge overwrites its attributes, as in
+    nx.DiGraph). Only the 'relation' and 'confidence' edge attributes
+    are stored.
+
+    Implements the subset of the nx.DiGraph API GraphRAG uses, plus a
+    vectorized multi-source hop expansion (expand).
+    """
+
+    def __init__(self):
+        self._node_ids: List[Any] = []
+        self._node_index: Dict[Any, int] = {}
+        self._node_attrs: List[Dict[str, Any]] = []
+
+        self._relations: List[str] = []
+        self._relation_codes: Dict[str, int] = {}
+
+        # Committed CSR arrays (rows sorted by source, then target)
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.empty(0, dtype=np.int32)
+        self._edge_relation = np.empty(0, dtype=np.int32)
+        self._edge_confidence = np.empty(0, dtype=np.float64)
+
+        # Edges added since the last compaction
+        self._pending_source: List[int] = []
+        self._pending_target: List[int] = []
+        self._pending_relation: List[int] = []
+        self._pending_confidence: List[float] = []
+        self._pending_pairs: Set[Tuple[int, int]] = set()
+        self._compact_lock = threading.Lock()
+
+        # Reverse (CSC) adjacency for predecessors, rebuilt after compaction
+        self._reverse: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    # ---- construction ----
+
+    def add_node(self, node: Any, **attrs):
+        self._node_attrs[self._intern(node)].update(attrs)
+
+    def add_nodes_from(self, nodes: Iterable[Any]):
+        for node in nodes:
+            if isinstance(node, (tuple, list)) and len(node) == 2 and isinstance(node[1], dict):
+                self.add_node(node[0], **node[1])
+            else:
+                self.add_node(node)
+
+    def add_edge(self, source: Any, target: Any, **attrs):
+        source_row, target_row = self._intern(source), self._intern(target)
+        self._pending_source.append(source_row)
+        self._pending_target.append(target_row)
+        self._pending_pairs.add((source_row, target_row))
+
+        relation = attrs.get('relation')
+        code = -1
+        if relation is not None:
+            code = self._relation_codes.get(relation)
+            if code is None:
+                code = len(self._relations)
+                self._relation_codes[relation] = code
+                self._relations.append(relation)
+        self._pending_relation.append(code)
+
+        self._pending_confidence.append(attrs.get('confidence', 1.0))
+
+    def add_edges_from(self, edges: Iterable[Tuple]):
+        for edge in edges:
+            if len(edge) == 3:
+                self.add_edge(edge[0], edge[1], **edge[2])
+            else:
+                self.add_edge(edge[0], edge[1])
+
+    def load_arrays(
+        self,
+        nodes: Sequence[Tuple[Any, Dict[str, Any]]],
+        source: np.ndarray,
+        target: np.ndarray,
+        relation: np.ndarray,
+        confidence: np.ndarray,
+        relations: Sequence[str]
+    ):
+        """
+        Replace the graph contents with snapshot arrays (see GraphRAG.save)
+
+        Edges are unique (source, target) positions into nodes, with
+        relation codes into relations. They are put in CSR order with one
+        argsort instead of being replayed through add_edge.
+        """
+        self._node_ids = [node for node, _ in nodes]
+        self._node_index = {node: i for i, node in enumerate(self._node_ids)}
+        self._node_attrs = [dict(attrs) for _, attrs in nodes]
+        self._relations = list(relations)
+        self._relation_codes = {name: code for code, name in enumerate(self._relations)}
+
+        n_nodes = len(self._node_ids)
+        source = np.asarray(source, dtype=np.int64)
+        order = np.argsort(source * n_nodes + np.asarray(target, dtype=np.int64), kind='stable')
+        self._indices = np.asarray(target, dtype=np.int32)[order]
+        self._edge_relation = np.asarray(relation, dtype=np.int32)[order]
+        self._edge_confidence = np.asarray(confidence, dtype=np.float64)[order]
+        self._indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source, minlength=n_nodes), out=self._indptr[1:])
+
+        self._pending_source = []
+        self._pending_target = []
+        self._pending_relation = []
+        self._pending_confidence = []
+        self._pending_pairs = set()
+        self._reverse = None
+
+    def _intern(self, node: Any) -> int:
+        index = self._node_index.get(node)
+        if index is None:
+            index = len(self._node_ids)
+            self._node_index[node] = index
+            self._node_ids.append(node)
+            self._node_attrs.append({})
+        return index
+
+    def _compact(self):
+        """Merge pending edges and extend indptr to cover new nodes"""
+        if not self._pending_source and len(self._indptr) == len(self._node_ids) + 1:
+            return
+        with self._compact_lock:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        """
+        Merge the pending edges into the CSR arrays
+
+        Only the pending edges are sorted; they are then merged into the
+        already sorted committed edges in one linear pass, so a compaction
+        costs O(E + P log P) rather than re-sorting all E edges.
+        """
+        n_nodes = len(self._node_ids)
+        if not self._pending_source and len(self._indptr) == n_nodes + 1:
+            return
+
+        source = np.array(self._pending_source, dtype=np.int64)
+        target = np.array(self._pending_target, dtype=np.int64)
+        pending_relation = np.array(self._pending_relation, dtype=np.int32)
+        pending_confidence = np.array(self._pending_confidence, dtype=np.float64)
+
+        # Sort pending by (source, target, insertion order); keep the last duplicate
+        order = np.lexsort((np.arange(len(source)), target, source))
+        source, target = source[order], target[order]
+        is_last = np.ones(len(order), dtype=bool)
+        is_last[:-1] = (source[1:] != source[:-1]) | (target[1:] != target[:-1])
+        keep = order[is_last]
+        source, target = source[is_last], target[is_last]
+        pending_relation = pending_relation[keep]
+        pending_confidence = pending_confidence[keep]
+
+        # Committed edges are unique and sorted by (source, target), i.e.
+        # by source * n_nodes + target
+        n_rows = len(self._indptr) - 1
+        committed_keys = np.repeat(np.arange(n_rows, dtype=np.int64), np.diff(self._indptr))
+        committed_keys = committed_keys * n_nodes + self._indices
+        pending_keys = source * n_nodes + target
+        positions = np.searchsorted(committed_keys, pending_keys)
+        exists = np.zeros(len(positions), dtype=bool)
+        in_range = positions < len(committed_keys)
+        exists[in_range] = committed_keys[positions[in_range]] == pending_keys[in_range]
+
+        # Re-added edges overwrite their attributes, new ones are inserted
+        relation = self._edge_relation.copy()
+        confidence = self._edge_confidence.copy()
+        relation[positions[exists]] = pending_relation[exists]
+        confidence[positions[exists]] = pending_confidence[exists]
+
+        new = ~exists
+        counts = np.zeros(n_nodes, dtype=np.int64)
+        counts[:n_rows] = np.diff(self._indptr)
+        counts += np.bincount(source[new], minlength=n_nodes)
+
+        self._indices = np.insert(self._indices, positions[new], target[new].astype(np.int32))
+        self._edge_relation = np.insert(relation, positions[new], pending_relation[new])
+        self._edge_confidence = np.insert(confidence, positions[new], pending_confidence[new])
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        self._indptr = indptr
+
+        self._pending_source = []
+        self._pending_target = []
+        self._pending_relation = []
+        self._pending_confidence = []
+        self._pending_pairs = set()
+        self._reverse = None
+
+    # ---- queries ----
+
+    def __len__(self) -> int:
+        return len(self._node_ids)
+
+    def __contains__(self, node: Any) -> bool:
+        return node in self._node_index
+
+    def __iter__(self):
+        return iter(self._node_ids)
+
+    def has_node(self, node: Any) -> bool:
+        return node in self._node_index
+
+    def number_of_nodes(self) -> int:
+        return len(self._node_ids)
+
+    def number_of_edges(self) -> int:
+        self._compact()
+        return len(self._indices)
+
+    @property
+    def nodes(self) -> "_CSRNodeView":
+        return _CSRNodeView(self, None)
+
+    def neighbors(self, node: Any) -> Iterable[Any]:
+        """Successors of node (as nx.DiGraph.neighbors)"""
+        self._compact()
+        row = self._node_index[node]
+        node_ids = self._node_ids
+        return (
+            node_ids[i]
+            for i in self._indices[self._indptr[row]:self._indptr[row + 1]].tolist()
+        )
+
+    successors = neighbors
+
+    def predecessors(self, node: Any) -> Iterable[Any]:
+        """Nodes with an edge into node (reverse CSR, built lazily)"""
+        indptr, sources, _ = self._reverse_arrays()
+        row = self._node_index[node]
+        node_ids = self._node_ids
+        return (node_ids[i] for i in sources[indptr[row]:indptr[row + 1]].tolist())
+
+    def edge_items(self, node: Any, reverse: bool = False) -> List[Tuple[Any, Dict[str, Any]]]:
+        """(neighbour, edge attrs) for out-edges of node, or in-edges if reverse"""
+        self._compact()
+        row = self._node_index[node]
+        if reverse:
+            indptr, sources, positions = self._reverse_arrays()
+            positions = positions[indptr[row]:indptr[row + 1]]
+            neighbors = sources[indptr[row]:indptr[row + 1]]
+        else:
+            positions = np.arange(self._indptr[row], self._indptr[row + 1])
+            neighbors = self._indices[positions]
+
+        items = []
+        for neighbor, code, confidence in zip(
+            neighbors.tolist(),
+            self._edge_relation[positions].tolist(),
+            self._edge_confidence[positions].tolist()
+        ):
+            attrs = {'confidence': confidence}
+            if code >= 0:
+                attrs['relation'] = self._relations[code]
+            items.append((self._node_ids[neighbor], attrs))
+        return items
+
+    def _reverse_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Reverse adjacency: (indptr, source rows, forward edge positions)"""
+        self._compact()
+        with self._compact_lock:
+            if self._reverse is None:
+                n_nodes = len(self._node_ids)
+                sources = np.repeat(np.arange(n_nodes, dtype=np.int32), np.diff(self._indptr))
+                order = np.argsort(self._indices, kind='stable')
+                indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+                np.cumsum(np.bincount(self._indices, minlength=n_nodes), out=indptr[1:])
+                self._reverse = (indptr, sources[order], order)
+            return self._reverse
+
+    def _edge_mask(
+        self,
+        positions: np.ndarray,
+        min_confidence: Optional[float],
+        relations: Optional[Iterable[str]]
+    ) -> np.ndarray:
+        """Boolean mask of the edges at positions passing the filters"""
+        mask = np.ones(len(positions), dtype=bool)
+        if min_confidence is not None:
+            mask &= self._edge_confidence[positions] >= min_confidence
+        if relations is not None:
+            codes = [self._relation_codes[r] for r in relations if r in self._relation_codes]
+            mask &= np.isin(self._edge_relation[positions], codes)
+        return mask
+
+    def has_edge(self, source: Any, target: Any) -> bool:
+        """Edge lookup that doesn't compact (cheap between writes)"""
+        if source not in self._node_index or target not in self._node_index:
+            return False
+        row, column = self._node_index[source], self._node_index[target]
+        if (row, column) in self._pending_pairs:
+            return True
+
+        with self._compact_lock:
+            indptr, indices = self._indptr, self._indices
+        if row + 1 >= len(indptr):
+            return False
+        targets = indices[indptr[row]:indptr[row + 1]]
+        position = np.searchsorted(targets, column)
+        return bool(position < len(targets) and targets[position] == column)
+
+    def edges(self, data: bool = False) -> List[Tuple]:
+        self._compact()
+        return self._edge_tuples(np.arange(len(self._indices)), data)
+
+    def _edge_tuples(self, positions: np.ndarray, data: bool) -> List[Tuple]:
+        """Materialize (source, target[, attrs]) for CSR edge positions"""
+        sources = np.searchsorted(self._indptr, positions, side='right') - 1
+        node_ids = self._node_ids
+        pairs = zip(sources.tolist(), self._indices[positions].tolist())
+        if not data:
+            return [(node_ids[s], node_ids[t]) for s, t in pairs]
+
+        edges = []
+        for (s, t), code, confidence in zip(
+            pairs,
+            self._edge_relation[positions].tolist(),
+            self._edge_confidence[positions].tolist()
+        ):
+            attrs = {'confidence': confidence}
+            if code >= 0:
+                attrs['relation'] = self._relations[code]
+            edges.append((node_ids[s], node_ids[t], attrs))
+        return edges
+
+    def _out_edge_positions(self, rows: np.ndarray) -> np.ndarray:
+        """CSR positions of all out-edges of rows (vectorized gather)"""
+        starts = self._indptr[rows]
+        counts = self._indptr[rows + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        return np.arange(total, dtype=np.int64) + offsets
+
+    def expand(
+        self,
+        seed_ids: Iterable[Any],
+        max_hops: int,
+        max_frontier: Optional[int] = None,
+        min_confidence: Optional[float] = None,
+        relations: Optional[Iterable[str]] = None
+    ) -> Dict[Any, int]:
+        """
+        Vectorized multi-source BFS: one array gather per hop
+
+        Edges below min_confidence or outside relations are not followed.
+
+        Returns:
+            Dict of node id -> hop distance from the nearest seed
+        """
+        self._compact()
+        rows = [self._node_index[seed] for seed in seed_ids if seed in self._node_index]
+        frontier = np.array(list(dict.fromkeys(rows)), dtype=np.int64)
+
+        visited = np.zeros(len(self._node_ids), dtype=bool)
+        visited[frontier] = True
+        levels = [frontier]
+
+        for _ in range(max_hops):
+            positions = self._out_edge_positions(frontier)
+            if min_confidence is not None or relations is not None:
+                positions = positions[self._edge_mask(positions, min_confidence, relations)]
+            neighbors = self._indices[positions]
+            neighbors = neighbors[~visited[neighbors]]
+            if len(neighbors) == 0:
+                break
+
+            # Deduplicate, keeping first-discovery order
+            _, first = np.unique(neighbors, return_index=True)
+            frontier = neighbors[np.sort(first)].astype(np.int64)
+            if max_frontier is not None:
+                frontier = frontier[:max_frontier]
+
+            visited[frontier] = True
+            levels.append(frontier)
+
+        node_ids = self._node_ids
+        return {
+            node_ids[row]: depth
+            for depth, level in enumerate(levels)
+            for row in level.tolist()
+        }
+
+    def subgraph(self, nodes: Iterable[Any]) -> "CSRSubgraph":
+        return CSRSubgraph(self, nodes)
+
+    def to_undirected(self) -> nx.Graph:
+        """Structure-only undirected copy (for community detection)"""
+        self._compact()
+        graph = nx.Graph()
+        graph.add_nodes_from(self._node_ids)
+        graph.add_edges_from(self._edge_tuples(np.arange(len(self._indices)), data=False))
+        return graph
+
+
+class CSRSubgraph:
+    """Read-only node-induced view of a CSRGraph"""
+
+    def __init__(self, parent: CSRGraph, nodes: Iterable[Any]):
+        parent._compact()
+        self._parent = parent
+        self._rows = np.array(
+            sorted({parent._node_index[n] for n in nodes if n in parent._node_index}),
+            dtype=np.int64
+        )
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, node: Any) -> bool:
+        return node in self.nodes
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def number_of_nodes(self) -> int:
+        return len(self._rows)
+
+    @property
+    def nodes(self) -> "_CSRNodeView":
+        return _CSRNodeView(self._parent, self._rows)
+
+    def edges(self, data: bool = False) -> List[Tuple]:
+        parent = self._parent
+        positions = parent._out_edge_positions(self._rows)
+        positions = positions[np.isin(parent._indices[positions], self._rows)]
+        return parent._edge_tuples(positions, data)
+
+
+class _CSRNodeView:
+    """nx-style node view: iterable, callable with data=, indexable by id"""
+
+    def __init__(self, graph: CSRGraph, rows: Optional[np.ndarray]):
+        self._graph = graph
+        self._rows = rows
+
+    def _row_list(self) -> Iterable[int]:
+        if self._rows is None:
+            return range(len(self._graph._node_ids))
+        return self._rows.tolist()
+
+    def __iter__(self):
+        node_ids = self._graph._node_ids
+        return (node_ids[row] for row in self._row_list())
+
+    def __len__(self) -> int:
+        return len(self._graph._node_ids) if self._rows is None else len(self._rows)
+
+    def __contains__(self, node: Any) -> bool:
+        row = self._graph._node_index.get(node)
+        if row is None or self._rows is None:
+            return row is not None
+        position = np.searchsorted(self._rows, row)
+        return position < len(self._rows) and self._rows[position] == row
+
+    def __getitem__(self, node: Any) -> Dict[str, Any]:
+        return self._graph._node_attrs[self._graph._node_index[node]]
+
+    def __call__(self, data: bool = False):
+        node_ids = self._graph._node_ids
+        if not data:
+            return list(self)
+        attrs = self._graph._node_attrs
+        return [(node_ids[row], attrs[row]) for row in self._row_list()]
+
+
+class QueryCache:
+    """
+    LRU + TTL cache for GraphRAG.query results
+
+    Exact hits are keyed by (question, query params) and skip the encode
+    entirely. With semantic_threshold set, a miss falls back to comparing
+    the question embedding against cached questions with the same params
+    and reuses the result if cosine similarity is at or above the
+    threshold.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: Optional[float] = None,
+        semantic_threshold: Optional[float] = None
+    ):
+        """
+        Args:
+            max_size: Maximum cached results (least recently used evicted)
+            ttl: Seconds before an entry expires (None: never)
+            semantic_threshold: Cosine similarity for near-duplicate hits
+                (None: exact-text hits only)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+
+        # key -> (created_at, normalized question embedding, result)
+        self._entries: "OrderedDict[Tuple, Tuple[float, np.ndarray, Dict[str, Any]]]" = OrderedDict()
+        self._semantic_keys: Optional[List[Tuple]] = None
+        self._semantic_matrix: Optional[np.ndarray] = None
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        # aquery() runs retrieval on worker threads
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """Exact lookup by (question, *params); does not count a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def get_similar(self, embedding: np.ndarray, params: Tuple) -> Optional[Dict[str, Any]]:
+        """Semantic lookup among entries with the same params; counts a miss if none"""
+        with self._lock:
+            if self.semantic_threshold is not None and self._entries:
+                if self._semantic_matrix is None:
+                    self._semantic_keys = list(self._entries)
+                    self._semantic_matrix = np.stack(
+                        [self._entries[key][1] for key in self._semantic_keys]
+                    )
+
+                scores = self._semantic_matrix @ _normalize_rows(np.atleast_2d(embedding))[0]
+                for i in np.argsort(-scores):
+                    if scores[i] < self.semantic_threshold:
+                        break
+                    key = self._semantic_keys[i]
+                    if key[1:] != params or key not in self._entries:
+                        continue
+                    entry = self._entries[key]
+                    if self._expired(entry):
+                        continue
+
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return entry[2]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple, embedding: np.ndarray, result: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic(),
+                _normalize_rows(np.atleast_2d(embedding))[0],
+                result
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._semantic_matrix = None
+
+    def clear(self):
+        """Drop all entries (called when the graph changes)"""
+        with self._lock:
+            self._entries.clear()
+            self._semantic_matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.semantic_hits) / lookups if lookups else 0.0
+        }
+
+    def _expired(self, entry: Tuple) -> bool:
+        return self.ttl is not None and time.monotonic() - entry[0] > self.ttl
+
+    def _remove(self, key: Tuple):
+        del self._entries[key]
+        self._semantic_matrix = None
+
+
+class EncodeBatcher:
+    """
+    Micro-batches concurrent async encode requests
+
+    Requests arriving within max_wait seconds of each other (or until
+    max_batch_size is reached) are encoded with a single embedder.encode
+    call in an executor thread, then each caller's future is resolved
+    with its own row.
+    """
+
+    def __init__(
+        self,
+        embedder: Any,
+        max_batch_size: int = 64,
+        max_wait: float = 0.005,
+        executor: Optional[ThreadPoolExecutor] = None
+    ):
+        self.embedder = embedder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = executor
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def encode(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        texts = [text for text, _ in batch]
+        futures = [future for _, future in batch]
+        loop = futures[0].get_loop()
+
+        try:
+            encoded = loop.run_in_executor(
+                self.executor,
+                functools.partial(self.embedder.encode, texts, batch_size=len(texts))
+            )
+        except Exception as e:
+            # e.g. the executor was shut down by GraphRAG.close()
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        encoded.add_done_callback(lambda done: self._resolve(done, futures))
+
+    @staticmethod
+    def _resolve(done: asyncio.Future, futures: List[asyncio.Future]):
+        # exception() raises on a cancelled future; cancel the callers instead
+        if done.cancelled():
+            for future in futures:
+                future.cancel()
+            return
+
+        if done.exception() is not None:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(done.exception())
+            return
+
+        for future, embedding in zip(futures, done.result()):
+            if not future.done():
+                future.set_result(embedding)
+
+
+class _Stage:
+    """Context manager adding its elapsed time to trace.timings[name]"""
+
+    __slots__ = ('trace', 'name', 'start')
+
+    def __init__(self, trace: "QueryTrace", name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        timings = self.trace.timings
+        timings[self.name] = timings.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+class QueryTrace:
+    """
+    Stage timings (seconds) and size counters for one GraphRAG query
+
+    Created per query only when GraphRAG instrumentation is enabled;
+    otherwise the query runs against NULL_TRACE, whose methods do nothing.
+    """
+
+    def __init__(self, question: str):
+        self.question = question
+        self.timings: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._start = time.perf_counter()
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def count(self, name: str, value: int):
+        self.counts[name] = value
+
+    def finish(self) -> Dict[str, Any]:
+        """Close the trace and return the record passed to sinks"""
+        self.timings['total'] = time.perf_counter() - self._start
+        return {
+            'question': self.question,
+            'timestamp': time.time(),
+            'timings': self.timings,
+            'counts': self.counts
+        }
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class _NullTrace:
+    """Disabled instrumentation: no clock reads, no allocations"""
+
+    __slots__ = ()
+    _stage = _NullStage()
+
+    def stage(self, name: str) -> _NullStage:
+        return self._stage
+
+    def count(self, name: str, value: int):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class LatencyHistogram:
+    """
+    Prometheus-style cumulative histogram of stage latencies
+
+    Use as a GraphRAG instrumentation sink; render() returns the text
+    exposition format for a /metrics endpoint.
+    """
+
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self, name: str = "graphrag_query_stage_seconds", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[str, List[int]] = {}
+        self._sums: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, record: Dict[str, Any]):
+        with self._lock:
+            for stage, seconds in record['timings'].items():
+                counts = self._counts.get(stage)
+                if counts is None:
+                    counts = self._counts[stage] = [0] * (len(self.buckets) + 1)
+                # Last slot is +Inf
+                counts[bisect.bisect_left(self.buckets, seconds)] += 1
+                self._sums[stage] += seconds
+
+    def render(self) -> str:
+        lines = [f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for stage, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f'{self.name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{self.name}_sum{{stage="{stage}"}} {self._sums[stage]}')
+                lines.append(f'{self.name}_count{{stage="{stage}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+
+class TraceBuffer:
+    """
+    In-memory ring buffer of the most recent query trace records
+
+    Use as a GraphRAG instrumentation sink to inspect slow queries.
+    """
+
+    def __init__(self, max_records: int = 1000):
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def __call__(self, record: Dict[str, Any]):
+        with self._lock:
+            self._records.append(record)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def records(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._records)
+
+    def percentiles(self, stage: str, q: Sequence[float] = (50, 95)) -> Dict[str, float]:
+        """Latency percentiles (ms) of a stage over the buffered records"""
+        samples = [r['timings'][stage] for r in self.records() if stage in r['timings']]
+        if not samples:
+            return {}
+        values = np.percentile(np.array(samples) * 1000, q)
+        return {f'p{p:g}_ms': float(v) for p, v in zip(q, values)}
+
+
+class DocumentStore:
+    """
+    Source documents for GraphRAG, stored once per doc_id
+
+    Entity nodes reference documents by doc_id instead of carrying the
+    full text themselves.
+    """
+
+    def __init__(self):
+        self._documents: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._documents
+
+    def add(
+        self,
+        doc_id: str,
+        text: str,
+        metadata: Dict[str, Any],
+        entity_ids: List[str]
+    ):
+        """Store (or replace) a document and the entity ids extracted from it"""
+        self._documents[doc_id] = {
+            'text': text,
+            'metadata': metadata,
+            'entities': entity_ids
+        }
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Document dict with 'text', 'metadata' and 'entities', or None"""
+        return self._documents.get(doc_id)
+
+    def items(self) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        return self._documents.items()
+
+
+def _chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Lazily split an iterable into lists of up to size items"""
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Per-process extractor for add_documents_parallel workers, created by the
+# pool initializer
+_worker_extractor: Optional[Any] = None
+
+
+def _init_extractor(extractor_factory: Callable[[], Any]):
+    global _worker_extractor
+    _worker_extractor = extractor_factory()
+
+
+def _extract_chunk(docs: List[Dict[str, Any]]) -> List[Tuple]:
+    """Process-pool task: run the worker extractor's hooks over a chunk of documents"""
+    return [GraphRAG._extract_document(_worker_extractor, doc) for doc in docs]
+
+
+GRAPH_BACKENDS = {
+    'networkx': nx.DiGraph,
+    'csr': CSRGraph
+}
+
+
 class GraphRAG:
     """
     GraphRAG: Combine Knowledge Graphs with RAG for better reasoning
@@ -16,80 +1690,742 @@ class GraphRAG:
     - Complex reasoning requiring graph traversal
     """
 
-    def __init__(self, embedding_model: str = "BAAI/bge-large-en-v1.5"):
-        self.graph = nx.DiGraph()
-        self.embedder = SentenceTransformer(embedding_model)
-        self.entity_embeddings = {}
+    def __init__(
+        self,
+        embedding_model: str = "BAAI/bge-large-en-v1.5",
+        entity_index: Optional[EntityIndex] = None,
+        graph_backend: str = "networkx",
+        query_cache: Optional[QueryCache] = None,
+        token_counter: Callable[[str], int] = estimate_tokens,
+        embedder: Optional[Any] = None,
+        instrumentation: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        """
+        Args:
+            embedding_model: SentenceTransformer model name, resolved through
+                the shared embedder registry (loaded on first encode, one
+                instance per process)
+            entity_index: Entity search backend, e.g. IVFEntityIndex for
+                large graphs (default: exact EntityIndex)
+            graph_backend: "networkx" (nx.DiGraph) or "csr" (CSRGraph,
+                compact arrays for very large graphs)
+            query_cache: Optional QueryCache for repeated / near-duplicate
+                questions; cleared whenever documents are added
+            token_counter: Token count function for context budgets
+                (e.g. a tiktoken encoder's len(encode(text)))
+            embedder: Explicit embedder with SentenceTransformer's encode()
+                (e.g. a HashingEmbedder stub); overrides embedding_model
+            instrumentation: Optional sink called with a trace record
+                (stage timings, size counters) after every query, e.g. a
+                LatencyHistogram, a TraceBuffer or any callable. When set,
+                query results also carry 'timings' and 'counts'.
+        """
+        if graph_backend not in GRAPH_BACKENDS:
+            raise ValueError(
+                f"Unknown graph_backend: {graph_backend} (choose from {list(GRAPH_BACKENDS)})"
+            )
+
+        self.embedding_model = embedding_model
+        self.graph_backend = graph_backend
+        self.graph = GRAPH_BACKENDS[graph_backend]()
+        self.embedder = embedder if embedder is not None else get_embedder(embedding_model)
+        self.entity_index = entity_index if entity_index is not None else EntityIndex()
+        self.documents = DocumentStore()
+        self.lexical_index = LexicalIndex()
+        self.query_cache = query_cache
+        self.token_counter = token_counter
+        self.instrumentation = instrumentation
+
+        # Cached Louvain partition, maintained incrementally (community_detection)
+        self._partition: Optional[Dict[str, int]] = None
+        self._partition_modularity = 0.0
+        self._community_internal: Counter = Counter()
+        self._community_degree: Counter = Counter()
+        self._community_edge_count = 0
+        self._community_new_nodes: List[str] = []
+        self._community_new_edges: List[Tuple[str, str]] = []
+        self._community_summaries: Optional[Dict[int, Dict[str, Any]]] = None
+        self._community_index_cache: Optional[Tuple[List[int], np.ndarray, List[np.ndarray]]] = None
+        self._community_lock = threading.Lock()
+
+        # Created on first aquery()
+        self.encode_batcher: Optional[EncodeBatcher] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
 
     def add_document(self, doc_id: str, text: str, metadata: Dict[str, Any]):
         """
         Extract entities and relationships, add to knowledge graph
         """
+        self.add_documents([{'id': doc_id, 'text': text, 'metadata': metadata}])
+
+    def add_documents(
+        self,
+        documents: Iterable[Dict[str, Any]],
+        batch_size: int = 256
+    ) -> int:
+        """
+        Bulk ingestion: extract per document, embed entities in large batches
+
+        Documents are buffered until about batch_size entity strings are
+        pending, then embedded with a single encode call and written to the
+        graph and entity index in bulk.
+
+        Args:
+            documents: Iterable of dicts with keys 'id', 'text' and
+                optional 'metadata'
+            batch_size: Number of entity strings per encode call
+
+        Returns:
+            Number of documents ingested
+        """
+        pending = []
+        pending_entities = 0
+        count = 0
+
+        for doc in documents:
+            extracted = self._extract_document(doc)
+            pending.append(extracted)
+            pending_entities += len(extracted[3])
+            count += 1
+
+            if pending_entities >= batch_size:
+                self._ingest_batch(pending, batch_size)
+                pending = []
+                pending_entities = 0
+
+        if pending:
+            self._ingest_batch(pending, batch_size)
+
+        return count
+
+    def add_documents_parallel(
+        self,
+        documents: Iterable[Dict[str, Any]],
+        workers: Optional[int] = None,
+        chunk_size: int = 64,
+        max_pending: Optional[int] = None,
+        ordered: bool = True,
+        batch_size: int = 256,
+        extractor_factory: Optional[Callable[[], Any]] = None,
+        mp_context: Optional[Any] = None
+    ) -> int:
+        """
+        Pipelined bulk ingestion for CPU-heavy extractors
+
+        Stages:
+        1. A process pool runs _extract_entities / _extract_relationships
+           on chunks of chunk_size documents
+        2. At most max_pending chunks are in flight; the documents
+           iterable is only consumed as slots free up (backpressure), so
+           a multi-GB corpus streams through bounded memory
+        3. This process embeds the extracted entities in batches of
+           batch_size and is the single writer to the graph and index
+
+        Each worker calls extractor_factory once (in the pool
+        initializer) and runs the returned object's _extract_entities /
+        _extract_relationships, so NER models and other state set up in
+        __init__ are available. The factory is pickled to the workers: use
+        a class or module-level function, not a lambda or local class.
+
+        Args:
+            documents: Iterable of dicts with keys 'id', 'text' and
+                optional 'metadata'
+            workers: Extraction processes (default: CPU count)
+            chunk_size: Documents per extraction task
+            max_pending: Maximum chunks in flight (default: 2 * workers)
+            ordered: Merge chunks in input order (deterministic first-mention
+                attributes); False merges whichever chunk finishes first
+            batch_size: Number of entity strings per encode call
+            extractor_factory: Zero-argument callable returning an object
+                with the extraction hooks, e.g. an instance of this
+                GraphRAG subclass (default: type(self), i.e. the subclass
+                constructed with default arguments; the embedding model is
+                lazy, so workers never load it)
+            mp_context: Optional multiprocessing context for the pool
+
+        Returns:
+            Number of documents ingested
+        """
+        extractor_factory = extractor_factory or type(self)
+        workers = workers or os.cpu_count()
+        max_pending = max_pending or 2 * workers
+        chunks = _chunked(documents, chunk_size)
+
+        pending = []
+        pending_entities = 0
+        count = 0
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp_context,
+            initializer=_init_extractor,
+            initargs=(extractor_factory,)
+        ) as pool:
+            in_flight = deque()
+            exhausted = False
+
+            while True:
+                while not exhausted and len(in_flight) < max_pending:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                    else:
+                        in_flight.append(pool.submit(_extract_chunk, chunk))
+
+                if not in_flight:
+                    break
+
+                if ordered:
+                    finished = [in_flight.popleft()]
+                else:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    in_flight = deque(future for future in in_flight if future not in finished)
+
+                for future in finished:
+                    for extracted in future.result():
+                        pending.append(extracted)
+                        pending_entities += len(extracted[3])
+                        count += 1
+
+                if pending_entities >= batch_size:
+                    self._ingest_batch(pending, batch_size)
+                    pending = []
+                    pending_entities = 0
+
+        if pending:
+            self._ingest_batch(pending, batch_size)
+
+        return count
+
+    def _extract_document(
+        self,
+        doc: Dict[str, Any]
+    ) -> Tuple[str, str, Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Run the extraction hooks on one document (picklable result)"""
         # 1. Entity extraction (using NER or LLM)
-        entities = self._extract_entities(text)
+        entities = self._extract_entities(doc['text'])
 
         # 2. Relationship extraction
-        relationships = self._extract_relationships(text, entities)
-
-        # 3. Add to graph
-        for entity in entities:
-            self.graph.add_node(
-                entity['id'],
-                type=entity['type'],
-                name=entity['name'],
-                text=text,
-                doc_id=doc_id
-            )
+        relationships = self._extract_relationships(doc['text'], entities)
 
-            # Embed entity
-            self.entity_embeddings[entity['id']] = self.embedder.encode(
-                f"{entity['name']}: {entity.get('description', '')}"
-            )
+        return doc['id'], doc['text'], doc.get('metadata') or {}, entities, relationships
 
-        for rel in relationships:
-            self.graph.add_edge(
-                rel['source'],
-                rel['target'],
-                relation=rel['type'],
-                confidence=rel.get('confidence', 1.0)
-            )
+    def _ingest_batch(
+        self,
+        extracted: List[Tuple[str, str, Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]],
+        batch_size: int
+    ):
+        """
+        Embed and write a batch of extracted documents
+
+        Repeated mentions of an entity are merged into one node: ids are
+        interned, the first mention's name/type/doc_id are kept, later
+        mentions only bump its 'mentions' count, and entities that are
+        already embedded are not re-encoded. Document text is stored once
+        in self.documents rather than on every entity node.
+
+        Args:
+            extracted: (doc_id, text, metadata, entities, relationships) per
+                document, in ingestion order
+        """
+        nodes = {}
+        to_embed = {}
+        edges = []
+
+        for doc_id, text, metadata, entities, relationships in extracted:
+            doc_id = sys.intern(doc_id)
+            entity_ids = []
+
+            for entity in entities:
+                entity_id = sys.intern(entity['id'])
+                entity_ids.append(entity_id)
+
+                attrs = nodes.get(entity_id)
+                if attrs is None and entity_id in self.graph:
+                    attrs = self.graph.nodes[entity_id]
+
+                if attrs:
+                    attrs['mentions'] = attrs.get('mentions', 1) + 1
+                else:
+                    nodes[entity_id] = {
+                        'type': entity['type'],
+                        'name': entity['name'],
+                        'doc_id': doc_id,
+                        'mentions': 1
+                    }
+                    self.lexical_index.add(entity_id, entity['name'], entity.get('description', ''))
+
+                if entity_id not in self.entity_index and entity_id not in to_embed:
+                    to_embed[entity_id] = f"{entity['name']}: {entity.get('description', '')}"
+
+            self.documents.add(doc_id, text, metadata, entity_ids)
+
+            for rel in relationships:
+                edges.append((
+                    sys.intern(rel['source']),
+                    sys.intern(rel['target']),
+                    {
+                        'relation': rel['type'],
+                        'confidence': rel.get('confidence', 1.0)
+                    }
+                ))
+
+        # Embed all new entities of the batch in one forward pass
+        if to_embed:
+            embeddings = self.embedder.encode(list(to_embed.values()), batch_size=batch_size)
+            self.entity_index.add(list(to_embed), embeddings)
+
+        nodes = list(nodes.items())
+        if self._partition is not None:
+            self._track_community_changes(nodes, edges)
+
+        self.graph.add_nodes_from(nodes)
+        self.graph.add_edges_from(edges)
+
+        if self.query_cache is not None:
+            self.query_cache.clear()
 
     def query(
         self,
         question: str,
         max_hops: int = 2,
-        top_k_entities: int = 5
+        top_k_entities: int = 5,
+        max_frontier: Optional[int] = None,
+        context_token_budget: Optional[int] = None,
+        top_communities: Optional[int] = None,
+        min_confidence: Optional[float] = None,
+        relations: Optional[Iterable[str]] = None,
+        retrieval: str = "vector"
     ) -> Dict[str, Any]:
         """
         Query the knowledge graph with multi-hop reasoning
+
+        Args:
+            question: Natural language question
+            max_hops: Graph expansion depth around the seed entities
+            top_k_entities: Number of seed entities from similarity search
+            max_frontier: Optional cap on nodes discovered per hop
+            context_token_budget: Optional token limit for 'context';
+                most relevant lines are kept
+            top_communities: Community-first retrieval - match the question
+                against community centroids and search entities only in the
+                best top_communities communities (None: search all entities)
+            min_confidence: Don't expand along edges with lower confidence
+            relations: Only expand along edges of these relation types
+            retrieval: "vector" (embedding search) or "hybrid" (embedding
+                and BM25 lexical rankings fused by reciprocal rank; if the
+                question names entities exactly, those are the seeds and
+                the question is never encoded)
+
+        Returns:
+            Dict with 'entities', 'relationships', 'context' and 'graph';
+            with instrumentation enabled also 'timings' (seconds per stage:
+            cache, encode, search, expand, subgraph, context, total) and
+            'counts' (seeds, subgraph_nodes, subgraph_edges, ...)
         """
+        params, trace, cached, seeds = self._start_query(
+            question,
+            max_hops=max_hops,
+            top_k_entities=top_k_entities,
+            max_frontier=max_frontier,
+            context_token_budget=context_token_budget,
+            top_communities=top_communities,
+            min_confidence=min_confidence,
+            relations=relations,
+            retrieval=retrieval
+        )
+        if cached is not None:
+            return cached
+        if seeds:
+            return self._finish_trace(trace, self._retrieve(question, None, params, trace, seeds))
+
         # 1. Find relevant entities
-        query_embedding = self.embedder.encode(question)
-        relevant_entities = self._find_relevant_entities(
-            query_embedding,
-            top_k=top_k_entities
+        with trace.stage('encode'):
+            query_embedding = self.embedder.encode(question)
+
+        return self._finish_trace(trace, self._retrieve(question, query_embedding, params, trace))
+
+    async def aquery(
+        self,
+        question: str,
+        max_hops: int = 2,
+        top_k_entities: int = 5,
+        max_frontier: Optional[int] = None,
+        context_token_budget: Optional[int] = None,
+        top_communities: Optional[int] = None,
+        min_confidence: Optional[float] = None,
+        relations: Optional[Iterable[str]] = None,
+        retrieval: str = "vector"
+    ) -> Dict[str, Any]:
+        """
+        Asynchronous query for serving many concurrent users
+
+        The question encode is micro-batched with other in-flight aquery
+        calls (one embedder.encode per batch, see EncodeBatcher), and
+        retrieval runs in a thread pool so the event loop never blocks.
+        Wrap calls in asyncio tasks to get per-request futures.
+
+        Retrieval threads only read the graph; don't ingest documents
+        while aquery calls are in flight.
+        """
+        params, trace, cached, seeds = self._start_query(
+            question,
+            max_hops=max_hops,
+            top_k_entities=top_k_entities,
+            max_frontier=max_frontier,
+            context_token_budget=context_token_budget,
+            top_communities=top_communities,
+            min_confidence=min_confidence,
+            relations=relations,
+            retrieval=retrieval
+        )
+        if cached is not None:
+            return cached
+        if seeds:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self._get_executor(),
+                functools.partial(self._retrieve, question, None, params, trace, seeds)
+            )
+            return self._finish_trace(trace, result)
+
+        if self.encode_batcher is None:
+            self.encode_batcher = EncodeBatcher(self.embedder, executor=self._get_executor())
+        # Includes time queued behind other requests in the micro-batch
+        with trace.stage('encode'):
+            query_embedding = await self.encode_batcher.encode(question)
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            self._get_executor(),
+            functools.partial(self._retrieve, question, query_embedding, params, trace)
         )
+        return self._finish_trace(trace, result)
+
+    def _start_query(
+        self,
+        question: str,
+        max_hops: int,
+        top_k_entities: int,
+        max_frontier: Optional[int],
+        context_token_budget: Optional[int],
+        top_communities: Optional[int],
+        min_confidence: Optional[float],
+        relations: Optional[Iterable[str]],
+        retrieval: str
+    ) -> Tuple[Dict[str, Any], QueryTrace, Optional[Dict[str, Any]], List[str]]:
+        """
+        Shared query() / aquery() prologue
+
+        Returns:
+            (params, trace, finished result on an exact cache hit or None,
+            exact-match seeds for hybrid retrieval)
+        """
+        params = {
+            'max_hops': max_hops,
+            'top_k_entities': top_k_entities,
+            'max_frontier': max_frontier,
+            'context_token_budget': context_token_budget,
+            'top_communities': top_communities,
+            'min_confidence': min_confidence,
+            'relations': frozenset(relations) if relations is not None else None,
+            'retrieval': retrieval
+        }
+        trace = QueryTrace(question) if self.instrumentation is not None else NULL_TRACE
 
-        # 2. Expand via graph traversal
-        subgraph_nodes = set()
-        for entity_id in relevant_entities:
-            subgraph_nodes.update(
-                self._expand_entity(entity_id, max_hops=max_hops)
+        if self.query_cache is not None:
+            with trace.stage('cache'):
+                cached = self.query_cache.get(_cache_key(question, params))
+            if cached is not None:
+                trace.count('cache_hit', 1)
+                return params, trace, self._finish_trace(trace, cached), []
+
+        return params, trace, None, self._exact_seeds(question, params, trace)
+
+    def _exact_seeds(
+        self,
+        question: str,
+        params: Dict[str, Any],
+        trace: QueryTrace
+    ) -> List[str]:
+        """Hybrid retrieval short-circuit: entities named verbatim in the question"""
+        if params['retrieval'] not in RETRIEVAL_MODES:
+            raise ValueError(
+                f"Unknown retrieval: {params['retrieval']} (choose from {list(RETRIEVAL_MODES)})"
+            )
+        if params['retrieval'] != "hybrid":
+            return []
+
+        with trace.stage('exact_match'):
+            seeds = self.lexical_index.exact_matches(question)[:params['top_k_entities']]
+        if seeds:
+            trace.count('exact_match', len(seeds))
+        return seeds
+
+    def _finish_trace(self, trace: QueryTrace, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Send the trace to the instrumentation sink and attach it to a copy of result"""
+        if trace is NULL_TRACE:
+            return result
+
+        record = trace.finish()
+        self.instrumentation(record)
+        # Copy: result may be the object held by the query cache
+        return {**result, 'timings': record['timings'], 'counts': record['counts']}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Thread pool shared by aquery retrieval and batched encodes"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        return self._executor
+
+    def close(self):
+        """Shut down the aquery thread pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self.encode_batcher = None
+
+    def _retrieve(
+        self,
+        question: str,
+        query_embedding: Optional[np.ndarray],
+        params: Dict[str, Any],
+        trace: QueryTrace = NULL_TRACE,
+        seeds: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Everything in query() after the question is encoded (params: query() kwargs)
+
+        With seeds given (exact name matches), query_embedding is None:
+        the semantic cache, entity search and similarity ranking are skipped.
+        """
+        cache_key = _cache_key(question, params)
+        if self.query_cache is not None and query_embedding is not None:
+            with trace.stage('semantic_cache'):
+                cached = self.query_cache.get_similar(query_embedding, cache_key[1:])
+            if cached is not None:
+                trace.count('cache_hit', 1)
+                return cached
+
+        if seeds is not None:
+            relevant_entities = seeds
+        elif params['retrieval'] == "hybrid":
+            with trace.stage('search'):
+                relevant_entities = self._find_hybrid_entities(
+                    question,
+                    query_embedding,
+                    top_k=params['top_k_entities'],
+                    top_communities=params['top_communities']
+                )
+        else:
+            with trace.stage('search'):
+                relevant_entities = self._find_relevant_entities(
+                    query_embedding,
+                    top_k=params['top_k_entities'],
+                    top_communities=params['top_communities']
+                )
+        trace.count('seeds', len(relevant_entities))
+
+        # 2. Expand via graph traversal (one BFS from all seeds)
+        with trace.stage('expand'):
+            distances = self._expand_entities(
+                relevant_entities,
+                max_hops=params['max_hops'],
+                max_frontier=params['max_frontier'],
+                min_confidence=params['min_confidence'],
+                relations=params['relations']
             )
+            subgraph_nodes = set(distances)
+        trace.count('subgraph_nodes', len(subgraph_nodes))
 
         # 3. Extract subgraph
-        subgraph = self.graph.subgraph(subgraph_nodes)
+        with trace.stage('subgraph'):
+            subgraph = self.graph.subgraph(subgraph_nodes)
+            relationships = list(subgraph.edges(data=True))
+        trace.count('subgraph_edges', len(relationships))
 
         # 4. Generate answer using subgraph context
-        context = self._subgraph_to_context(subgraph)
+        similarities = None
+        if params['context_token_budget'] is not None and query_embedding is not None:
+            with trace.stage('similarities'):
+                similarities = self.entity_index.similarities(query_embedding, subgraph_nodes)
+        with trace.stage('context'):
+            context = self._subgraph_to_context(
+                subgraph,
+                token_budget=params['context_token_budget'],
+                distances=distances,
+                similarities=similarities
+            )
+        trace.count('context_chars', len(context))
 
-        return {
+        result = {
             'entities': list(subgraph_nodes),
-            'relationships': list(subgraph.edges(data=True)),
+            'relationships': relationships,
             'context': context,
             'graph': subgraph
         }
 
+        # Exact-match results skip the encode anyway, so they are not cached
+        if self.query_cache is not None and query_embedding is not None:
+            self.query_cache.put(cache_key, query_embedding, result)
+
+        return result
+
+    def save(self, path: str):
+        """
+        Write a snapshot of the graph and entity index to a directory
+
+        Layout:
+            graph.json      Nodes with attributes, relation vocabulary
+            edges.npz       Edge columns: source, target, relation, confidence
+            embeddings.npy  Normalized float32 entity matrix (mmap-able)
+            entity_ids.json Entity id per embedding row
+            documents.json  Document store (text, metadata, entity ids)
+            lexical.json    LexicalIndex state (BM25 postings, entity names)
+            index_state.npz Entity index search state, e.g. IVF centroids
+                            (only for indexes that have any)
+        """
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        nodes = list(self.graph.nodes(data=True))
+        node_index = {node_id: i for i, (node_id, _) in enumerate(nodes)}
+
+        relations: Dict[str, int] = {}
+        sources, targets, relation_codes, confidences = [], [], [], []
+        for source, target, data in self.graph.edges(data=True):
+            sources.append(node_index[source])
+            targets.append(node_index[target])
+            relation = data.get('relation', 'related_to')
+            relation_codes.append(relations.setdefault(relation, len(relations)))
+            confidences.append(data.get('confidence', 1.0))
+
+        with open(directory / "graph.json", "w", encoding="utf-8") as f:
+            json.dump({
+                'version': SNAPSHOT_VERSION,
+                'embedding_model': self.embedding_model,
+                'graph_backend': self.graph_backend,
+                'nodes': nodes,
+                'relations': list(relations)
+            }, f, ensure_ascii=False)
+
+        np.savez(
+            directory / "edges.npz",
+            source=np.array(sources, dtype=np.int32),
+            target=np.array(targets, dtype=np.int32),
+            relation=np.array(relation_codes, dtype=np.int32),
+            confidence=np.array(confidences, dtype=np.float64)
+        )
+
+        np.save(directory / "embeddings.npy", np.ascontiguousarray(self.entity_index.matrix))
+        with open(directory / "entity_ids.json", "w", encoding="utf-8") as f:
+            json.dump(self.entity_index.ids, f, ensure_ascii=False)
+        with open(directory / "documents.json", "w", encoding="utf-8") as f:
+            json.dump(dict(self.documents.items()), f, ensure_ascii=False)
+        with open(directory / "lexical.json", "w", encoding="utf-8") as f:
+            json.dump(self.lexical_index.to_dict(), f, ensure_ascii=False)
+
+        state = self.entity_index.state_arrays()
+        state_path = directory / "index_state.npz"
+        if state:
+            np.savez(state_path, **state)
+        elif state_path.exists():
+            state_path.unlink()
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        mmap: bool = True,
+        embedding_model: Optional[str] = None,
+        entity_index: Optional[EntityIndex] = None,
+        graph_backend: Optional[str] = None,
+        embedder: Optional[Any] = None
+    ) -> "GraphRAG":
+        """
+        Restore a snapshot written by save()
+
+        Args:
+            path: Snapshot directory
+            mmap: Memory-map embeddings.npy read-only, so processes loading
+                the same snapshot share one copy through the page cache
+            embedding_model: Override the model recorded in the snapshot
+            entity_index: Empty index backend to load the embeddings into
+            graph_backend: Override the graph backend recorded in the snapshot
+            embedder: Explicit embedder instance (see __init__)
+
+        Returns:
+            GraphRAG instance ready to query
+        """
+        directory = Path(path)
+        with open(directory / "graph.json", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        version = meta.get('version', 0)
+        if not 1 <= version <= SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {version}")
+
+        graph_rag = cls(
+            embedding_model=embedding_model or meta['embedding_model'],
+            entity_index=entity_index,
+            graph_backend=graph_backend or meta.get('graph_backend', 'networkx'),
+            embedder=embedder
+        )
+
+        with np.load(directory / "edges.npz") as edges:
+            relations = meta['relations']
+            if isinstance(graph_rag.graph, CSRGraph):
+                # Straight into the CSR arrays, no per-edge Python work
+                graph_rag.graph.load_arrays(
+                    meta['nodes'],
+                    edges['source'],
+                    edges['target'],
+                    edges['relation'],
+                    edges['confidence'],
+                    relations
+                )
+            else:
+                node_ids = [node_id for node_id, _ in meta['nodes']]
+                graph_rag.graph.add_nodes_from(meta['nodes'])
+                graph_rag.graph.add_edges_from(
+                    (
+                        node_ids[source],
+                        node_ids[target],
+                        {'relation': relations[relation], 'confidence': confidence}
+                    )
+                    for source, target, relation, confidence in zip(
+                        edges['source'].tolist(),
+                        edges['target'].tolist(),
+                        edges['relation'].tolist(),
+                        edges['confidence'].tolist()
+                    )
+                )
+
+        with open(directory / "entity_ids.json", encoding="utf-8") as f:
+            entity_ids = json.load(f)
+        matrix = np.load(directory / "embeddings.npy", mmap_mode='r' if mmap else None)
+        state = None
+        if (directory / "index_state.npz").exists():
+            with np.load(directory / "index_state.npz") as saved:
+                state = dict(saved)
+        graph_rag.entity_index.load_arrays(entity_ids, matrix, state=state)
+
+        # Version 1 snapshots kept document text on the entity nodes
+        if version >= 2:
+            with open(directory / "documents.json", encoding="utf-8") as f:
+                for doc_id, doc in json.load(f).items():
+                    graph_rag.documents.add(doc_id, doc['text'], doc['metadata'], doc['entities'])
+
+        # Older snapshots have no lexical index: rebuild from entity names
+        if version >= 3:
+            with open(directory / "lexical.json", encoding="utf-8") as f:
+                graph_rag.lexical_index = LexicalIndex.from_dict(json.load(f))
+        else:
+            for node_id, data in graph_rag.graph.nodes(data=True):
+                graph_rag.lexical_index.add(node_id, data.get('name', ''))
+
+        return graph_rag
+
     def _extract_entities(self, text: str) -> List[Dict[str, Any]]:
         """
         Extract entities using NER or LLM
@@ -132,74 +2468,365 @@ class GraphRAG:
     def _find_relevant_entities(
         self,
         query_embedding: np.ndarray,
-        top_k: int
+        top_k: int,
+        top_communities: Optional[int] = None
     ) -> List[str]:
         """
         Find entities most similar to query
+
+        With top_communities set and a cached partition (see
+        community_detection), the query is first scored against community
+        centroids and only members of the best communities are searched.
+        Falls back to the flat search when there is no partition or the
+        selected communities hold fewer than top_k entities. Entities
+        ingested since the last community_detection() are first folded
+        into the partition (cheap, see _update_partition), so they stay
+        searchable.
         """
-        similarities = {}
-        for entity_id, embedding in self.entity_embeddings.items():
-            similarity = np.dot(query_embedding, embedding) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(embedding)
-            )
-            similarities[entity_id] = similarity
+        if top_communities is not None and self._partition is not None:
+            # aquery() retrieves on several threads at once
+            with self._community_lock:
+                self._update_partition()
+                community_ids, centroids, member_rows = self._community_index()
+            if community_ids:
+                query = _normalize_rows(np.atleast_2d(query_embedding))[0]
+                best = _top_k_indices(centroids @ query, top_communities)
+                rows = np.concatenate([member_rows[i] for i in best])
+                if len(rows) >= top_k:
+                    return [
+                        entity_id
+                        for entity_id, _ in self.entity_index.search(
+                            query_embedding, top_k, rows=rows
+                        )
+                    ]
 
-        # Top K
-        sorted_entities = sorted(
-            similarities.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )
-        return [entity_id for entity_id, _ in sorted_entities[:top_k]]
+        return [
+            entity_id
+            for entity_id, _ in self.entity_index.search(query_embedding, top_k)
+        ]
+
+    def _find_hybrid_entities(
+        self,
+        question: str,
+        query_embedding: np.ndarray,
+        top_k: int,
+        top_communities: Optional[int] = None
+    ) -> List[str]:
+        """
+        Fuse embedding and BM25 rankings with reciprocal rank fusion
+
+        Each side contributes top_k * HYBRID_CANDIDATE_FACTOR candidates,
+        so an entity ranked moderately by both can beat one ranked first
+        by only one.
+        """
+        n_candidates = top_k * HYBRID_CANDIDATE_FACTOR
+        vector_ranking = self._find_relevant_entities(query_embedding, n_candidates, top_communities)
+        lexical_ranking = [
+            entity_id for entity_id, _ in self.lexical_index.search(question, n_candidates)
+        ]
+        return _reciprocal_rank_fusion([vector_ranking, lexical_ranking], top_k)
 
     def _expand_entity(self, entity_id: str, max_hops: int) -> set:
         """
         Expand entity via graph traversal (BFS)
         """
-        visited = set()
-        queue = [(entity_id, 0)]
+        return set(self._expand_entities([entity_id], max_hops=max_hops))
+
+    def _expand_entities(
+        self,
+        seed_ids: List[str],
+        max_hops: int,
+        max_frontier: Optional[int] = None,
+        min_confidence: Optional[float] = None,
+        relations: Optional[Iterable[str]] = None
+    ) -> Dict[str, int]:
+        """
+        Multi-source BFS from all seeds at once
+
+        Nodes are marked visited when enqueued, so each node is queued at
+        most once, and nodes at max_hops are not expanded further.
+
+        Args:
+            seed_ids: Start entities (hop 0)
+            max_hops: Maximum hop distance from the nearest seed
+            max_frontier: Optional cap on newly discovered nodes per hop;
+                once reached, further neighbours at that hop are dropped
+                (keeps expansion bounded around hubs)
+            min_confidence: Skip edges with a lower 'confidence'
+            relations: Only follow edges with one of these 'relation' types
+
+        Returns:
+            Dict of node id -> hop distance from the nearest seed
+        """
+        if isinstance(self.graph, CSRGraph):
+            return self.graph.expand(
+                seed_ids, max_hops, max_frontier, min_confidence, relations
+            )
+
+        filtered = min_confidence is not None or relations is not None
+
+        distances = {}
+        queue = deque()
+        for seed in seed_ids:
+            if seed in self.graph and seed not in distances:
+                distances[seed] = 0
+                queue.append(seed)
+
+        discovered = Counter()
 
         while queue:
-            current, depth = queue.pop(0)
-            if depth > max_hops:
+            current = queue.popleft()
+            depth = distances[current]
+            if depth >= max_hops:
+                continue
+
+            if filtered:
+                neighbors = (
+                    neighbor
+                    for neighbor, data in self.graph.succ[current].items()
+                    if _edge_allowed(data, min_confidence, relations)
+                )
+            else:
+                neighbors = self.graph.neighbors(current)
+
+            for neighbor in neighbors:
+                if neighbor in distances:
+                    continue
+                if max_frontier is not None and discovered[depth + 1] >= max_frontier:
+                    break
+
+                distances[neighbor] = depth + 1
+                discovered[depth + 1] += 1
+                queue.append(neighbor)
+
+        return distances
+
+    def find_paths(
+        self,
+        sources: Iterable[str],
+        targets: Iterable[str],
+        k: int = 3,
+        max_hops: int = 4,
+        min_confidence: Optional[float] = None,
+        relations: Optional[Iterable[str]] = None,
+        beam_width: int = 64
+    ) -> List[Dict[str, Any]]:
+        """
+        k best paths from any source to any target (bidirectional beam search)
+
+        Answers "How are X and Y connected?" without expanding full k-hop
+        neighbourhoods. A path's score is the product of its edge
+        confidences. A forward search from the sources (out-edges) and a
+        backward search from the targets (in-edges) each go about
+        max_hops / 2 hops, keeping only the beam_width cheapest new nodes
+        per hop; paths are joined where the two searches meet, and the k
+        best distinct joins are returned.
+
+        Args:
+            sources: Start entity ids
+            targets: End entity ids
+            k: Number of paths
+            max_hops: Maximum path length in edges
+            min_confidence: Prune edges with a lower 'confidence'
+            relations: Only follow edges with one of these 'relation' types
+            beam_width: Nodes kept per hop on each side
+
+        Returns:
+            List of {'nodes': [...], 'relations': [...], 'score': float},
+            best first
+        """
+        relations = set(relations) if relations is not None else None
+        forward_hops = (max_hops + 1) // 2
+
+        forward = self._beam_search(
+            sources, forward_hops, min_confidence, relations, beam_width, reverse=False
+        )
+        backward = self._beam_search(
+            targets, max_hops - forward_hops, min_confidence, relations, beam_width, reverse=True
+        )
+
+        joins = []
+        for node in forward.keys() & backward.keys():
+            cost_f, _, _, depth_f = forward[node]
+            cost_b, _, _, depth_b = backward[node]
+            if depth_f + depth_b <= max_hops:
+                joins.append((cost_f + cost_b, node))
+        joins.sort(key=lambda join: join[0])
+
+        paths = []
+        seen = set()
+        for cost, node in joins:
+            nodes, path_relations = self._trace_path(forward, node)
+            tail, tail_relations = self._trace_path(backward, node)
+            nodes = nodes + tail[::-1][1:]
+            path_relations = path_relations + tail_relations[::-1]
+
+            # Forward and backward halves may overlap on a node
+            if len(set(nodes)) != len(nodes) or tuple(nodes) in seen:
                 continue
+            seen.add(tuple(nodes))
+            paths.append({
+                'nodes': nodes,
+                'relations': path_relations,
+                'score': math.exp(-cost)
+            })
+            if len(paths) >= k:
+                break
+
+        return paths
+
+    def _beam_search(
+        self,
+        starts: Iterable[str],
+        max_hops: int,
+        min_confidence: Optional[float],
+        relations: Optional[set],
+        beam_width: int,
+        reverse: bool
+    ) -> Dict[str, Tuple[float, Optional[str], Optional[str], int]]:
+        """
+        Layered best-first search with -log(confidence) edge costs
+
+        Returns:
+            Dict of node -> (cost, parent, relation to parent, hops)
+        """
+        best = {
+            node: (0.0, None, None, 0)
+            for node in starts
+            if node in self.graph
+        }
+        frontier = list(best)
 
-            visited.add(current)
+        for depth in range(1, max_hops + 1):
+            candidates = {}
+            for node in frontier:
+                cost = best[node][0]
+                for neighbor, data in self._edge_items(node, reverse):
+                    if neighbor in best or not _edge_allowed(data, min_confidence, relations):
+                        continue
+                    confidence = min(data.get('confidence', 1.0), 1.0)
+                    if confidence <= 0:
+                        continue
+                    new_cost = cost - math.log(confidence)
+                    if neighbor not in candidates or new_cost < candidates[neighbor][0]:
+                        candidates[neighbor] = (
+                            new_cost, node, data.get('relation', 'related_to'), depth
+                        )
 
-            # Neighbors
-            for neighbor in self.graph.neighbors(current):
-                if neighbor not in visited:
-                    queue.append((neighbor, depth + 1))
+            kept = heapq.nsmallest(beam_width, candidates.items(), key=lambda item: item[1][0])
+            if not kept:
+                break
+            best.update(kept)
+            frontier = [node for node, _ in kept]
 
-        return visited
+        return best
 
-    def _subgraph_to_context(self, subgraph: nx.DiGraph) -> str:
+    @staticmethod
+    def _trace_path(
+        search: Dict[str, Tuple[float, Optional[str], Optional[str], int]],
+        node: str
+    ) -> Tuple[List[str], List[str]]:
+        """Nodes (start first) and relations along a _beam_search parent chain"""
+        nodes, relations = [node], []
+        while search[node][1] is not None:
+            _, parent, relation, _ = search[node]
+            nodes.append(parent)
+            relations.append(relation)
+            node = parent
+        return nodes[::-1], relations[::-1]
+
+    def _edge_items(self, node: str, reverse: bool = False) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        """(neighbour, edge attrs) over out-edges, or in-edges if reverse"""
+        if isinstance(self.graph, CSRGraph):
+            return self.graph.edge_items(node, reverse)
+        return (self.graph.pred if reverse else self.graph.succ)[node].items()
+
+    def _subgraph_to_context(
+        self,
+        subgraph: nx.DiGraph,
+        token_budget: Optional[int] = None,
+        distances: Optional[Dict[str, int]] = None,
+        similarities: Optional[Dict[str, float]] = None
+    ) -> str:
         """
         Convert subgraph to text context for LLM
+
+        Lines come from _iter_context_lines in relevance order and stop
+        at token_budget, so only the lines that fit are ever formatted.
         """
         context_parts = []
+        used = 0
+
+        for line in self._iter_context_lines(subgraph, distances, similarities):
+            if token_budget is not None:
+                used += self.token_counter(line)
+                if used > token_budget:
+                    break
+            context_parts.append(line)
+
+        return "\n".join(context_parts)
+
+    def _iter_context_lines(
+        self,
+        subgraph: nx.DiGraph,
+        distances: Optional[Dict[str, int]] = None,
+        similarities: Optional[Dict[str, float]] = None
+    ) -> Iterator[str]:
+        """
+        Lazily yield entity and relationship lines, most relevant first
+
+        Ranking, grouped by hop so nearer context always comes first:
+        - Entities at hop h, by similarity to the question
+        - Relationships whose farther endpoint is at hop h, by edge
+          confidence, then endpoint similarity
+
+        Only the (cheap) sort keys are built up front; a heap pops lines
+        one at a time and each line is formatted only when yielded.
+        """
+        distances = distances or {}
+        similarities = similarities or {}
+        heap = []
 
         # Entities
-        for node in subgraph.nodes(data=True):
-            node_id, data = node
-            context_parts.append(
-                f"Entity: {data.get('name', node_id)} ({data.get('type', 'Unknown')})"
-            )
+        for node_id, data in subgraph.nodes(data=True):
+            heap.append((
+                distances.get(node_id, 0),
+                0,
+                -similarities.get(node_id, 0.0),
+                len(heap),
+                (node_id, data)
+            ))
 
         # Relationships
-        for edge in subgraph.edges(data=True):
-            source, target, data = edge
-            relation = data.get('relation', 'related_to')
-            source_name = subgraph.nodes[source].get('name', source)
-            target_name = subgraph.nodes[target].get('name', target)
-
-            context_parts.append(
-                f"Relationship: {source_name} --{relation}--> {target_name}"
-            )
+        for source, target, data in subgraph.edges(data=True):
+            heap.append((
+                max(distances.get(source, 0), distances.get(target, 0)),
+                1,
+                -data.get('confidence', 1.0),
+                -(similarities.get(source, 0.0) + similarities.get(target, 0.0)),
+                len(heap),
+                (source, target, data)
+            ))
 
-        return "\n".join(context_parts)
+        heapq.heapify(heap)
+        nodes = subgraph.nodes
+        while heap:
+            item = heapq.heappop(heap)
+            if item[1] == 0:
+                node_id, data = item[-1]
+                yield f"Entity: {data.get('name', node_id)} ({data.get('type', 'Unknown')})"
+            else:
+                source, target, data = item[-1]
+                relation = data.get('relation', 'related_to')
+                source_name = nodes[source].get('name', source)
+                target_name = nodes[target].get('name', target)
+                yield f"Relationship: {source_name} --{relation}--> {target_name}"
 
-    def community_detection(self) -> Dict[int, List[str]]:
+    def community_detection(
+        self,
+        incremental: bool = False,
+        drift_threshold: float = 0.02
+    ) -> Dict[int, List[str]]:
         """
         Detect communities in the graph for better retrieval
 
@@ -207,18 +2834,207 @@ class GraphRAG:
         - Topic clustering
         - Document grouping
         - Hierarchical retrieval
+
+        Args:
+            incremental: Update the cached partition with nodes/edges added
+                since the last call instead of re-running Louvain; falls
+                back to a full run if there is no cached partition or
+                modularity has dropped by more than drift_threshold
+            drift_threshold: Allowed modularity drop before a full recompute
+
+        Returns:
+            Dict of community id -> entity ids
         """
+        if incremental and self._partition is not None:
+            self._update_partition()
+            if self._partition_modularity - self._modularity() <= drift_threshold:
+                return self._communities()
+
         from networkx.algorithms import community
 
-        # Louvain community detection
-        communities = community.louvain_communities(
-            self.graph.to_undirected()
-        )
+        # Louvain community detection (one undirected copy for the CSR
+        # backend, reused below)
+        undirected = self._undirected_graph()
+        communities = community.louvain_communities(undirected)
 
-        return {
-            i: list(comm)
+        self._partition = {
+            node: i
             for i, comm in enumerate(communities)
+            for node in comm
         }
+        self._community_new_nodes = []
+        self._community_new_edges = []
+        self._invalidate_communities()
+
+        # Modularity bookkeeping: intra-community edges and degree sums
+        self._community_internal = Counter()
+        self._community_degree = Counter()
+        self._community_edge_count = 0
+        for source, target in undirected.edges():
+            self._count_community_edge(source, target)
+        self._partition_modularity = self._modularity()
+
+        return self._communities()
+
+    def community_summaries(self, top_n: int = 5) -> Dict[int, Dict[str, Any]]:
+        """
+        Per-community summaries for prefiltering retrieval
+
+        Returns:
+            Dict of community id -> {
+                'size', 'top_entities' (highest degree first),
+                'types' (most common entity types), 'centroid' (normalized
+                mean embedding of the members, None if none are embedded)
+            }
+        """
+        if self._partition is None:
+            self.community_detection()
+        if self._community_summaries is not None:
+            return self._community_summaries
+
+        community_ids, centroids, _ = self._community_index()
+        centroid_of = dict(zip(community_ids, centroids))
+
+        summaries = {}
+        for community_id, members in self._communities().items():
+            degree = {member: self._degree(member) for member in members}
+            summaries[community_id] = {
+                'size': len(members),
+                'top_entities': sorted(members, key=degree.get, reverse=True)[:top_n],
+                'types': Counter(
+                    self.graph.nodes[member].get('type', 'Unknown') for member in members
+                ).most_common(top_n),
+                'centroid': centroid_of.get(community_id)
+            }
+
+        self._community_summaries = summaries
+        return summaries
+
+    def _community_index(self) -> Tuple[List[int], np.ndarray, List[np.ndarray]]:
+        """
+        Centroid matrix for community-first retrieval (cached per partition)
+
+        Returns:
+            (community ids, normalized centroid per community, entity index
+            rows of each community's members); communities without any
+            embedded member are left out
+        """
+        if self._community_index_cache is None:
+            community_ids, centroids, member_rows = [], [], []
+            for community_id, members in self._communities().items():
+                rows = self.entity_index.rows_for(members)
+                if len(rows):
+                    community_ids.append(community_id)
+                    centroids.append(self.entity_index.vectors(rows).sum(axis=0))
+                    member_rows.append(rows)
+
+            centroid_matrix = (
+                _normalize_rows(np.stack(centroids))
+                if centroids
+                else np.empty((0, self.entity_index.dim or 0), dtype=np.float32)
+            )
+            self._community_index_cache = (community_ids, centroid_matrix, member_rows)
+
+        return self._community_index_cache
+
+    def _invalidate_communities(self):
+        """Drop state derived from the partition (called whenever it changes)"""
+        self._community_summaries = None
+        self._community_index_cache = None
+        # Cached results may come from the old partition (or, before the
+        # first community_detection(), from the flat-search fallback)
+        if self.query_cache is not None:
+            self.query_cache.clear()
+
+    def _communities(self) -> Dict[int, List[str]]:
+        communities: Dict[int, List[str]] = {}
+        for node, community_id in self._partition.items():
+            communities.setdefault(community_id, []).append(node)
+        return communities
+
+    def _undirected_graph(self) -> nx.Graph:
+        """Undirected graph for Louvain (a view, not a copy, for networkx)"""
+        if isinstance(self.graph, nx.DiGraph):
+            return self.graph.to_undirected(as_view=True)
+        return self.graph.to_undirected()
+
+    def _undirected_neighbors(self, node: str) -> Iterable[str]:
+        yield from self.graph.successors(node)
+        yield from self.graph.predecessors(node)
+
+    def _degree(self, node: str) -> int:
+        return sum(1 for _ in self._undirected_neighbors(node))
+
+    def _track_community_changes(
+        self,
+        nodes: List[Tuple[str, Dict[str, Any]]],
+        edges: List[Tuple[str, str, Dict[str, Any]]]
+    ):
+        """Record nodes/undirected edges an ingest batch adds (before it is applied)"""
+        seen = set()
+        for node_id, _ in nodes:
+            if node_id not in self._partition and node_id not in seen:
+                seen.add(node_id)
+                self._community_new_nodes.append(node_id)
+
+        pairs = set()
+        for source, target, _ in edges:
+            for node_id in (source, target):
+                if node_id not in self._partition and node_id not in seen:
+                    seen.add(node_id)
+                    self._community_new_nodes.append(node_id)
+
+            pair = frozenset((source, target))
+            if pair in pairs:
+                continue
+            pairs.add(pair)
+            if not (self.graph.has_edge(source, target) or self.graph.has_edge(target, source)):
+                self._community_new_edges.append((source, target))
+
+    def _update_partition(self):
+        """Fold recorded nodes and edges into the cached partition"""
+        if not self._community_new_nodes and not self._community_new_edges:
+            return
+
+        # New nodes join the community most of their neighbours are in
+        next_id = max(self._partition.values(), default=-1) + 1
+        for node in self._community_new_nodes:
+            votes = Counter(
+                self._partition[neighbor]
+                for neighbor in self._undirected_neighbors(node)
+                if neighbor in self._partition
+            )
+            if votes:
+                self._partition[node] = votes.most_common(1)[0][0]
+            else:
+                self._partition[node] = next_id
+                next_id += 1
+
+        for source, target in self._community_new_edges:
+            self._count_community_edge(source, target)
+
+        self._community_new_nodes = []
+        self._community_new_edges = []
+        self._invalidate_communities()
+
+    def _count_community_edge(self, source: str, target: str):
+        source_community = self._partition[source]
+        target_community = self._partition[target]
+        self._community_edge_count += 1
+        self._community_degree[source_community] += 1
+        self._community_degree[target_community] += 1
+        if source_community == target_community:
+            self._community_internal[source_community] += 1
+
+    def _modularity(self) -> float:
+        """Modularity of the cached partition from the running edge counts"""
+        m = self._community_edge_count
+        if m == 0:
+            return 0.0
+        return sum(
+            self._community_internal[c] / m - (degree / (2 * m)) ** 2
+            for c, degree in self._community_degree.items()
+        )
 
 
 # Example Usage
@@ -240,8 +3056,7 @@ if __name__ == "__main__":
         }
     ]
 
-    for doc in docs:
-        graph_rag.add_document(doc['id'], doc['text'], doc['metadata'])
+    graph_rag.add_documents(docs)
 
     # Query (multi-hop)
     result = graph_rag.query(
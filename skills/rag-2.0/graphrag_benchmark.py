@@ -0,0 +1,515 @@
+# GraphRAG Benchmarks
+# Recall@k vs. latency / memory for entity index backends, and per-stage
+# latency / throughput / peak RSS of the full pipeline on a synthetic graph
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "_shared"))
+from embedder_registry import HashingEmbedder
+
+# Topics used for synthetic entity descriptions (similar entities share words)
+N_TOPICS = 64
+
+
+def load_graphrag_module():
+    """Import graphrag-example.py (hyphenated, so not importable by name), once per process"""
+    if "graphrag_example" in sys.modules:
+        return sys.modules["graphrag_example"]
+    path = Path(__file__).with_name("graphrag-example.py")
+    spec = importlib.util.spec_from_file_location("graphrag_example", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_embeddings(
+    n: int,
+    dim: int,
+    n_clusters: int = 256,
+    noise: float = 0.35,
+    seed: int = 0
+) -> np.ndarray:
+    """Clustered random embeddings (closer to real text embeddings than uniform noise)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    return centers[labels] + noise * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def scale_free_edges(
+    n_nodes: int,
+    n_edges: int,
+    uniform_fraction: float = 0.1,
+    seed: int = 0
+) -> List[Tuple[int, int]]:
+    """
+    Directed edges with a power-law degree distribution (preferential attachment)
+
+    Nodes arrive in order, each adding about n_edges / n_nodes edges to
+    earlier nodes. A target is drawn proportionally to its current degree
+    (a uniformly chosen endpoint of an existing edge), or uniformly among
+    earlier nodes with probability uniform_fraction. The result is a few
+    hubs and a long tail, like real knowledge graphs.
+    """
+    rng = np.random.default_rng(seed)
+    uniform = (rng.random(n_edges) < uniform_fraction).tolist()
+    picks = rng.random(n_edges).tolist()
+    endpoints: List[int] = []
+    edges = []
+
+    for j in range(n_edges):
+        source = 1 + j * (n_nodes - 1) // n_edges
+        if uniform[j] or not endpoints:
+            target = int(picks[j] * source)
+        else:
+            target = endpoints[int(picks[j] * len(endpoints))]
+        edges.append((source, target))
+        endpoints.append(source)
+        endpoints.append(target)
+
+    return edges
+
+
+def synthetic_documents(
+    n_nodes: int,
+    n_edges: int,
+    n_relations: int = 8,
+    edges_per_doc: int = 10,
+    seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Documents encoding a scale-free knowledge graph for SyntheticGraphRAG
+
+    Each document's text holds edges_per_doc "source target relation
+    confidence" lines; relation types follow a Zipf-like distribution.
+    """
+    rng = np.random.default_rng(seed + 1)
+    edges = scale_free_edges(n_nodes, n_edges, seed=seed)
+    weights = 1.0 / np.arange(1, n_relations + 1)
+    relations = rng.choice(n_relations, size=len(edges), p=weights / weights.sum()).tolist()
+    confidences = rng.uniform(0.5, 1.0, size=len(edges)).round(3).tolist()
+
+    lines = [
+        f"n{source} n{target} rel{relation} {confidence}"
+        for (source, target), relation, confidence in zip(edges, relations, confidences)
+    ]
+    return [
+        {'id': f"doc{i // edges_per_doc}", 'text': "\n".join(lines[i:i + edges_per_doc])}
+        for i in range(0, len(lines), edges_per_doc)
+    ]
+
+
+def entity_description(entity_id: str) -> str:
+    topic = int(entity_id[1:]) % N_TOPICS
+    return f"topic{topic} area{topic // 8}"
+
+
+def synthetic_graphrag_class(graphrag):
+    """GraphRAG subclass whose extraction hooks parse synthetic_documents text"""
+
+    class SyntheticGraphRAG(graphrag.GraphRAG):
+        def _extract_entities(self, text: str) -> List[Dict[str, Any]]:
+            entity_ids = dict.fromkeys(
+                entity_id for line in text.split("\n") for entity_id in line.split()[:2]
+            )
+            return [
+                {
+                    'id': entity_id,
+                    'name': f"Entity{entity_id[1:]}",
+                    'type': 'Synthetic',
+                    'description': entity_description(entity_id)
+                }
+                for entity_id in entity_ids
+            ]
+
+        def _extract_relationships(
+            self,
+            text: str,
+            entities: List[Dict[str, Any]]
+        ) -> List[Dict[str, Any]]:
+            relationships = []
+            for line in text.split("\n"):
+                source, target, relation, confidence = line.split()
+                relationships.append({
+                    'source': source,
+                    'target': target,
+                    'type': relation,
+                    'confidence': float(confidence)
+                })
+            return relationships
+
+    return SyntheticGraphRAG
+
+
+def synthetic_extractor():
+    """
+    Picklable extractor_factory for add_documents_parallel
+
+    Builds a SyntheticGraphRAG inside the worker (its class is created at
+    runtime, so instances can't be pickled to workers themselves).
+    """
+    return synthetic_graphrag_class(load_graphrag_module())(embedder=HashingEmbedder(1))
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes on Linux
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def _latency_stats(latencies: List[float]) -> Dict[str, float]:
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'mean_ms': float(np.mean(latencies_ms)),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95))
+    }
+
+
+def _stage_stats(latencies: List[float], **extra) -> Dict[str, Any]:
+    """Latency percentiles, throughput and peak RSS after a timed stage"""
+    total = sum(latencies)
+    return {
+        **_latency_stats(latencies),
+        'throughput_per_s': len(latencies) / total if total > 0 else None,
+        **extra,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def benchmark_ann(
+    n_entities: int = 200000,
+    dim: int = 256,
+    n_queries: int = 200,
+    top_k: int = 10,
+    n_lists: int = None,
+    n_probes: List[int] = (1, 2, 4, 8, 16, 32),
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Compare IVFEntityIndex against the exact EntityIndex scan
+
+    Returns:
+        Dict with exact-scan latency, IVF build time and, per n_probe,
+        recall@k (vs. exact results) and query latency
+    """
+    graphrag = load_graphrag_module()
+
+    vectors = synthetic_embeddings(n_entities, dim, seed=seed)
+    queries = synthetic_embeddings(n_queries, dim, seed=seed + 1)
+    ids = [f"e{i}" for i in range(n_entities)]
+
+    exact = graphrag.EntityIndex()
+    exact.add(ids, vectors)
+
+    start = time.perf_counter()
+    ivf = graphrag.IVFEntityIndex(n_lists=n_lists, min_train_size=0)
+    ivf.add(ids, vectors)
+    build_time = time.perf_counter() - start
+
+    truth = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        truth.append({entity_id for entity_id, _ in exact.search(query, top_k)})
+        latencies.append(time.perf_counter() - start)
+
+    report = {
+        'n_entities': n_entities,
+        'dim': dim,
+        'top_k': top_k,
+        'n_lists': len(ivf._centroids),
+        'ivf_build_s': build_time,
+        'exact': _latency_stats(latencies),
+        'ivf': []
+    }
+
+    for n_probe in n_probes:
+        hits = 0
+        latencies = []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            found = ivf.search(query, top_k, n_probe=n_probe)
+            latencies.append(time.perf_counter() - start)
+            hits += len(expected.intersection(entity_id for entity_id, _ in found))
+
+        report['ivf'].append({
+            'n_probe': n_probe,
+            f'recall@{top_k}': hits / (len(queries) * top_k),
+            **_latency_stats(latencies)
+        })
+
+    return report
+
+
+def benchmark_quantization(
+    n_entities: int = 200000,
+    dim: int = 256,
+    n_queries: int = 200,
+    top_k: int = 10,
+    rescore_factor: int = 4,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Memory, latency and recall@k of float16 / int8 EntityIndex storage
+
+    Recall is measured against the float32 exact scan; quantized
+    variants are run with and without full-precision rescoring. memory_mb
+    counts RAM only (rescoring vectors live in a memory-mapped file).
+    Expect float16 to halve memory but scan several times slower than
+    float32; int8 is the option that is both smaller and about as fast.
+    """
+    graphrag = load_graphrag_module()
+
+    vectors = synthetic_embeddings(n_entities, dim, seed=seed)
+    queries = synthetic_embeddings(n_queries, dim, seed=seed + 1)
+    ids = [f"e{i}" for i in range(n_entities)]
+
+    variants = [('float32', None), ('float16', None), ('int8', None),
+                ('float16', rescore_factor), ('int8', rescore_factor)]
+
+    truth = None
+    report = {'n_entities': n_entities, 'dim': dim, 'top_k': top_k, 'variants': []}
+
+    for dtype, rescore in variants:
+        index = graphrag.EntityIndex(dtype=dtype, rescore_factor=rescore)
+        index.add(ids, vectors)
+
+        results = []
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            results.append({entity_id for entity_id, _ in index.search(query, top_k)})
+            latencies.append(time.perf_counter() - start)
+
+        if truth is None:
+            truth = results
+        hits = sum(len(found & expected) for found, expected in zip(results, truth))
+
+        report['variants'].append({
+            'dtype': dtype,
+            'rescore_factor': rescore,
+            'memory_mb': index.memory_bytes() / 2 ** 20,
+            f'recall@{top_k}': hits / (len(queries) * top_k),
+            **_latency_stats(latencies)
+        })
+
+    return report
+
+
+def benchmark_pipeline(
+    n_nodes: int = 20000,
+    n_edges: int = 60000,
+    dim: int = 256,
+    n_queries: int = 200,
+    top_k: int = 5,
+    max_hops: int = 2,
+    max_frontier: Optional[int] = None,
+    graph_backend: str = "networkx",
+    edges_per_doc: int = 10,
+    batch_size: int = 256,
+    workers: Optional[int] = None,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Time each GraphRAG stage on a synthetic scale-free knowledge graph
+
+    Stages: ingestion (add_documents, then add_documents_parallel with
+    workers processes into a fresh instance), entity search, graph expansion,
+    context rendering, end-to-end query (including the question encode)
+    and community detection (full, then incremental after ingesting the
+    last 5% of documents). Embeddings come from HashingEmbedder, so the
+    numbers measure GraphRAG itself rather than the model.
+
+    Returns:
+        Dict of stage -> p50/p95 latency, throughput and peak RSS so far
+    """
+    graphrag = load_graphrag_module()
+    graph_rag = synthetic_graphrag_class(graphrag)(
+        graph_backend=graph_backend,
+        embedder=HashingEmbedder(dim)
+    )
+
+    documents = synthetic_documents(n_nodes, n_edges, edges_per_doc=edges_per_doc, seed=seed)
+    held_out = max(1, len(documents) // 20)
+    initial, late = documents[:-held_out], documents[-held_out:]
+
+    report = {
+        'n_nodes': n_nodes,
+        'n_edges': n_edges,
+        'dim': dim,
+        'graph_backend': graph_backend,
+        'top_k': top_k,
+        'max_hops': max_hops,
+        'stages': {}
+    }
+    stages = report['stages']
+
+    # Ingestion: one latency sample per add_documents batch
+    latencies = []
+    for start in range(0, len(initial), batch_size):
+        batch = initial[start:start + batch_size]
+        begin = time.perf_counter()
+        graph_rag.add_documents(batch, batch_size=batch_size)
+        latencies.append(time.perf_counter() - begin)
+    seconds = sum(latencies)
+    stages['ingest'] = _stage_stats(
+        latencies,
+        seconds=seconds,
+        docs_per_s=len(initial) / seconds,
+        entities_per_s=graph_rag.graph.number_of_nodes() / seconds,
+        edges_per_s=graph_rag.graph.number_of_edges() / seconds
+    )
+
+    # Parallel ingestion of the same documents into a fresh instance
+    parallel_rag = synthetic_graphrag_class(graphrag)(
+        graph_backend=graph_backend,
+        embedder=HashingEmbedder(dim)
+    )
+    begin = time.perf_counter()
+    parallel_rag.add_documents_parallel(
+        initial,
+        workers=workers,
+        batch_size=batch_size,
+        extractor_factory=synthetic_extractor
+    )
+    seconds = time.perf_counter() - begin
+    stages['ingest_parallel'] = {
+        'seconds': seconds,
+        'workers': workers or os.cpu_count(),
+        'docs_per_s': len(initial) / seconds,
+        'speedup': stages['ingest']['seconds'] / seconds,
+        'same_graph': (
+            parallel_rag.graph.number_of_nodes() == graph_rag.graph.number_of_nodes()
+            and parallel_rag.graph.number_of_edges() == graph_rag.graph.number_of_edges()
+        ),
+        'peak_rss_mb': peak_rss_mb()
+    }
+    del parallel_rag
+
+    start = time.perf_counter()
+    communities = graph_rag.community_detection()
+    full_detection = time.perf_counter() - start
+
+    # Questions name random entities, the way users ask about them
+    rng = np.random.default_rng(seed + 2)
+    entity_ids = [f"n{i}" for i in rng.integers(0, n_nodes, size=n_queries)]
+    questions = [f"Entity{entity_id[1:]}: {entity_description(entity_id)}" for entity_id in entity_ids]
+    embeddings = graph_rag.embedder.encode(questions)
+
+    search, expand, context, query = [], [], [], []
+    expanded_nodes, context_tokens = [], []
+    for question, embedding in zip(questions, embeddings):
+        begin = time.perf_counter()
+        seeds = graph_rag._find_relevant_entities(embedding, top_k=top_k)
+        search.append(time.perf_counter() - begin)
+
+        begin = time.perf_counter()
+        distances = graph_rag._expand_entities(seeds, max_hops=max_hops, max_frontier=max_frontier)
+        expand.append(time.perf_counter() - begin)
+        expanded_nodes.append(len(distances))
+
+        begin = time.perf_counter()
+        subgraph = graph_rag.graph.subgraph(set(distances))
+        text = graph_rag._subgraph_to_context(subgraph, distances=distances)
+        context.append(time.perf_counter() - begin)
+        context_tokens.append(graph_rag.token_counter(text))
+
+        begin = time.perf_counter()
+        graph_rag.query(question, max_hops=max_hops, top_k_entities=top_k, max_frontier=max_frontier)
+        query.append(time.perf_counter() - begin)
+
+    stages['search'] = _stage_stats(search)
+    stages['expand'] = _stage_stats(expand, mean_nodes=float(np.mean(expanded_nodes)))
+    stages['context'] = _stage_stats(context, mean_tokens=float(np.mean(context_tokens)))
+    stages['query'] = _stage_stats(query)
+
+    graph_rag.add_documents(late, batch_size=batch_size)
+    start = time.perf_counter()
+    graph_rag.community_detection(incremental=True)
+    incremental_detection = time.perf_counter() - start
+
+    stages['communities'] = {
+        'full_s': full_detection,
+        'incremental_s': incremental_detection,
+        'n_communities': len(communities),
+        'peak_rss_mb': peak_rss_mb()
+    }
+    report['peak_rss_mb'] = peak_rss_mb()
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GraphRAG entity index and pipeline benchmark")
+    parser.add_argument("mode", nargs="?", choices=["ann", "quantization", "pipeline"], default="ann")
+    parser.add_argument("--entities", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--nodes", type=int, default=20000, help="pipeline: graph nodes")
+    parser.add_argument("--edges", type=int, default=60000, help="pipeline: graph edges")
+    parser.add_argument("--backend", choices=["networkx", "csr"], default="networkx")
+    parser.add_argument("--max-hops", type=int, default=2)
+    parser.add_argument("--max-frontier", type=int, default=None)
+    parser.add_argument("--edges-per-doc", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None, help="pipeline: parallel ingestion processes")
+    parser.add_argument("--output", default=None, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    if args.mode == "pipeline":
+        report = benchmark_pipeline(
+            n_nodes=args.nodes,
+            n_edges=args.edges,
+            dim=args.dim,
+            n_queries=args.queries,
+            top_k=args.top_k,
+            max_hops=args.max_hops,
+            max_frontier=args.max_frontier,
+            graph_backend=args.backend,
+            edges_per_doc=args.edges_per_doc,
+            workers=args.workers
+        )
+    elif args.mode == "quantization":
+        report = benchmark_quantization(
+            n_entities=args.entities,
+            dim=args.dim,
+            n_queries=args.queries,
+            top_k=args.top_k
+        )
+    else:
+        report = benchmark_ann(
+            n_entities=args.entities,
+            dim=args.dim,
+            n_queries=args.queries,
+            top_k=args.top_k,
+            n_lists=args.n_lists,
+            n_probes=args.n_probe
+        )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()